@@ -0,0 +1,276 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import resource
+import subprocess
+import copy
+import numpy as np
+import torch
+from darknet import Darknet
+from utils import nms, boxes_iou_matrix
+
+
+def count_weights(model):
+
+    # Number of float32 values a .weights file holds for the given model, in file order
+    count = 0
+    for block, module in zip(model.blocks[1:], model.models):
+        if block['type'] == 'convolutional':
+            count += sum(p.numel() for p in module.parameters())
+            if int(block['batch_normalize']):
+                count += module[1].running_mean.numel() + module[1].running_var.numel()
+    return count
+
+
+def write_random_weights(cfgfile, weightfile):
+
+    # Write a .weights file of the right size filled with random values, for
+    # benchmarking when the real weights aren't available
+    model = Darknet(cfgfile)
+    with open(weightfile, 'wb') as fp:
+        np.array([0, 2, 0, 0, 0], dtype=np.int32).tofile(fp)
+        (np.random.rand(count_weights(model)) * 0.01).astype(np.float32).tofile(fp)
+
+
+def random_weights_path(cfgfile, weightfile):
+
+    # The given weights file if it exists, otherwise a temporary file of random weights
+    # which the caller has to delete. The default location of the real weights is never
+    # written to, so that the notebook can't pick up the random weights by accident.
+    if os.path.exists(weightfile):
+        return weightfile
+    print('{} not found, benchmarking with random weights'.format(weightfile))
+    fd, path = tempfile.mkstemp(suffix='.weights')
+    os.close(fd)
+    write_random_weights(cfgfile, path)
+    return path
+
+
+def read_rss():
+
+    # Current and peak resident set size in kB. The peak is reset by writing to clear_refs
+    # where the kernel allows it, otherwise it covers the whole lifetime of the process.
+    try:
+        with open('/proc/self/status') as fp:
+            status = dict(line.split(':', 1) for line in fp)
+        return int(status['VmRSS'].split()[0]), int(status['VmHWM'].split()[0])
+    except (OSError, KeyError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak, peak
+
+
+def reset_peak_rss():
+    try:
+        with open('/proc/self/clear_refs', 'w') as fp:
+            fp.write('5')
+    except OSError:
+        pass
+
+
+def measure_load(cfgfile, weightfile, mmap):
+
+    # Runs in a fresh process so that the peak RSS belongs to this loader only
+    model = Darknet(cfgfile)
+    reset_peak_rss()
+    base_rss, _ = read_rss()
+    start = time.time()
+    model.load_weights(weightfile, mmap=mmap)
+    elapsed = time.time() - start
+    _, peak_rss = read_rss()
+    print()
+    print('{:.3f} {}'.format(elapsed, peak_rss - base_rss))
+
+
+def measure_startup(cfgfile, weightfile, cachedir, init_weights):
+
+    # Time from nothing to the first boxes, in a fresh process
+    start = time.time()
+    model = Darknet(cfgfile, cachedir=cachedir, init_weights=init_weights)
+    built = time.time()
+    model.load_weights(weightfile)
+    loaded = time.time()
+    with torch.no_grad():
+        model.eval()(torch.rand(1, 3, model.height, model.width), 0.5)
+    finish = time.time()
+    print()
+    print('{:.3f} {:.3f} {:.3f}'.format(built - start, loaded - built, finish - loaded))
+
+
+def benchmark_startup(cfgfile, weightfile, cachedir='/tmp/darknet-cfg-cache', repeat=3):
+
+    # The cfg cache and skipping the throwaway weight initialization are measured one
+    # after the other, so that every row shows what one more change saves
+    for name, flags in [('default', []),
+                        ('cached', ['--cachedir', cachedir]),
+                        ('no-init', ['--cachedir', cachedir, '--no-init-weights'])]:
+        results = []
+        for _ in range(repeat):
+            out = subprocess.check_output([sys.executable, __file__, 'measure-startup', cfgfile, weightfile] + flags)
+            results.append([float(t) for t in out.decode().split()[-3:]])
+        build, load, forward = np.min(results, 0)
+        print('{:<8} build {:6.3f} s   load {:6.3f} s   first forward {:6.3f} s'.format(name, build, load, forward))
+
+
+def benchmark_load(cfgfile, weightfile, repeat=3):
+    for mmap in [False, True]:
+        times = []
+        rss = []
+        for _ in range(repeat):
+            out = subprocess.check_output([sys.executable, __file__, 'measure-load', cfgfile, weightfile] + (['--mmap'] if mmap else []))
+            elapsed, peak = out.decode().split()[-2:]
+            times.append(float(elapsed))
+            rss.append(int(peak))
+        print('{:<8} load {:7.3f} s   peak RSS +{:7.1f} MB'.format('mmap' if mmap else 'copy', min(times), min(rss) / 1024))
+
+
+def randomize_batchnorm(model):
+
+    # Random but well conditioned batchnorm statistics, so that folding them actually matters
+    for module in model.modules():
+        if isinstance(module, torch.nn.BatchNorm2d):
+            module.weight.data.uniform_(0.5, 1.5)
+            module.bias.data.uniform_(-0.1, 0.1)
+            module.running_mean.uniform_(-0.1, 0.1)
+            module.running_var.uniform_(0.5, 1.5)
+
+
+def time_forward(model, x, nms_thresh, repeat):
+    with torch.no_grad():
+        model(x, nms_thresh)
+        start = time.time()
+        for _ in range(repeat):
+            boxes = model(x, nms_thresh)
+    return (time.time() - start) / repeat, boxes
+
+
+def assert_same_boxes(boxes_a, boxes_b, atol):
+
+    # Both models must keep the same boxes, with the same values within tolerance
+    for head_a, head_b in zip(boxes_a, boxes_b):
+        for a, b in zip(head_a, head_b):
+            if a.shape != b.shape:
+                raise AssertionError('fused model kept different boxes')
+            if not torch.allclose(a, b, atol=atol):
+                raise AssertionError('fused boxes differ by up to {:.2e}'.format((a - b).abs().max().item()))
+
+
+def check_fuse(cfgfile, batch_size=2, resolution=160, nms_thresh=0.3, atol=1e-4, seed=0):
+
+    # Checks Darknet.fuse on random inputs without any weights file. The batchnorm
+    # statistics are always randomized, since the default ones fold into a no-op.
+    torch.manual_seed(seed)
+    model = Darknet(cfgfile).set_resolution(resolution)
+    randomize_batchnorm(model)
+    model.eval()
+    fused = copy.deepcopy(model).fuse()
+
+    x = torch.rand(batch_size, 3, model.height, model.width)
+    with torch.no_grad():
+        for a, b in zip(model.forward_features(x), fused.forward_features(x)):
+            if not torch.allclose(a, b, atol=atol):
+                raise AssertionError('fused features differ by up to {:.2e}'.format((a - b).abs().max().item()))
+        unfused_boxes = model(x, nms_thresh)
+        fused_boxes = fused(x, nms_thresh)
+    assert_same_boxes(unfused_boxes, fused_boxes, atol)
+    count = sum(boxes.size(0) for head_boxes in unfused_boxes for boxes in head_boxes)
+    print('fused features and {} boxes match the unfused model within {}'.format(count, atol))
+
+
+def benchmark_fuse(cfgfile, weightfile, batch_size=1, repeat=3, nms_thresh=0.5, atol=1e-3):
+    model = Darknet(cfgfile)
+    if os.path.exists(weightfile):
+        model.load_weights(weightfile)
+        print()
+    else:
+        randomize_batchnorm(model)
+    model.eval()
+    fused = copy.deepcopy(model).fuse()
+
+    x = torch.rand(batch_size, 3, model.height, model.width)
+    unfused_time, unfused_boxes = time_forward(model, x, nms_thresh, repeat)
+    fused_time, fused_boxes = time_forward(fused, x, nms_thresh, repeat)
+
+    assert_same_boxes(unfused_boxes, fused_boxes, atol)
+    print('fused boxes match the unfused boxes within {}'.format(atol))
+    print('unfused {:.3f} s/batch   fused {:.3f} s/batch'.format(unfused_time, fused_time))
+
+
+def compare_boxes(boxes_a, boxes_b, iou_thresh=0.5):
+
+    # Fraction of the reference boxes found again with the same class and an IOU above
+    # iou_thresh, and the mean IOU of those matches
+    if boxes_a.size(0) == 0:
+        return 1.0, 1.0
+    if boxes_b.size(0) == 0:
+        return 0.0, 0.0
+    ious = boxes_iou_matrix(boxes_a, boxes_b)
+    ious[boxes_a[:, 6, None] != boxes_b[None, :, 6]] = 0
+    best = ious.max(1)[0]
+    matched = best > iou_thresh
+    return matched.float().mean().item(), best[matched].mean().item() if matched.any() else 0.0
+
+
+def benchmark_quantize(cfgfile, weightfile, imagedir='images', repeat=3, nms_thresh=0.5, iou_thresh=0.4):
+    from quantize import load_calibration_images, quantize_model
+
+    model = Darknet(cfgfile)
+    if os.path.exists(weightfile):
+        model.load_weights(weightfile)
+        print()
+    else:
+        print('{} not found, the accuracy comparison uses random weights'.format(weightfile))
+        randomize_batchnorm(model)
+    model.eval()
+
+    images = load_calibration_images(imagedir, model.width, model.height, count=16)
+    qmodel = quantize_model(model, images[:8])
+
+    # Compare on the images that were not used for calibration, when there are any
+    x = images[8:] if images.size(0) > 8 else images
+    fp32_time, fp32_boxes = time_forward(model, x, nms_thresh, repeat)
+    int8_time, int8_boxes = time_forward(qmodel, x, nms_thresh, repeat)
+
+    recalls = []
+    mean_ious = []
+    for b in range(x.size(0)):
+        boxes_a = nms(torch.cat([head_boxes[b] for head_boxes in fp32_boxes]), iou_thresh)
+        boxes_b = nms(torch.cat([head_boxes[b] for head_boxes in int8_boxes]), iou_thresh)
+        recall, mean_iou = compare_boxes(boxes_a, boxes_b)
+        recalls.append(recall)
+        mean_ious.append(mean_iou)
+    print('int8 finds {:.1%} of the fp32 boxes, mean IOU {:.3f}'.format(np.mean(recalls), np.mean(mean_ious)))
+    print('fp32 {:.3f} s/batch   int8 {:.3f} s/batch   ({} images)'.format(fp32_time, int8_time, x.size(0)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('benchmark', choices=['load', 'measure-load', 'startup', 'measure-startup', 'fuse', 'check-fuse', 'quantize'])
+    parser.add_argument('cfgfile', nargs='?', default='cfg/yolov3.cfg')
+    parser.add_argument('weightfile', nargs='?', default='weights/yolov3.weights')
+    parser.add_argument('--mmap', action='store_true')
+    parser.add_argument('--cachedir')
+    parser.add_argument('--no-init-weights', action='store_true')
+    args = parser.parse_args()
+
+    if args.benchmark == 'measure-load':
+        measure_load(args.cfgfile, args.weightfile, args.mmap)
+    elif args.benchmark in ['load', 'startup']:
+        weightfile = random_weights_path(args.cfgfile, args.weightfile)
+        try:
+            if args.benchmark == 'load':
+                benchmark_load(args.cfgfile, weightfile)
+            else:
+                benchmark_startup(args.cfgfile, weightfile)
+        finally:
+            if weightfile != args.weightfile:
+                os.remove(weightfile)
+    elif args.benchmark == 'measure-startup':
+        measure_startup(args.cfgfile, args.weightfile, args.cachedir, not args.no_init_weights)
+    elif args.benchmark == 'fuse':
+        benchmark_fuse(args.cfgfile, args.weightfile)
+    elif args.benchmark == 'check-fuse':
+        check_fuse(args.cfgfile)
+    elif args.benchmark == 'quantize':
+        benchmark_quantize(args.cfgfile, args.weightfile)
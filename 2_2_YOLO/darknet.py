@@ -1,3 +1,6 @@
+import os
+import pickle
+import hashlib
 import torch
 import torch.nn as nn
 import numpy as np
@@ -59,10 +62,13 @@ class EmptyModule(nn.Module):
 
 # support route shortcut
 class Darknet(nn.Module):
-    def __init__(self, cfgfile):
+    def __init__(self, cfgfile, cachedir=None, init_weights=True):
         super(Darknet, self).__init__()
-        self.blocks = parse_cfg(cfgfile)
-        self.models = self.create_network(self.blocks) # merge conv, bn,leaky
+        # Without init_weights the parameters stay on the meta device until load_weights
+        # gives them their values, which skips allocating and initializing them twice
+        self.blocks, spec, self.plan = load_cfg(cfgfile, cachedir)
+        self.models = build_network(spec, None if init_weights else 'meta') # merge conv, bn,leaky
+        self.yolo_inds = [ind for ind, kind, _, _ in self.plan if kind == 'yolo']
         self.loss = self.models[len(self.models)-1]
 
         self.width = int(self.blocks[0]['width'])
@@ -71,137 +77,89 @@ class Darknet(nn.Module):
         self.header = torch.IntTensor([0,0,0,0])
         self.seen = 0
 
-    def forward(self, x, nms_thresh):            
-        ind = -2
+    def forward(self, x, nms_thresh):
         self.loss = None
-        outputs = dict()
         out_boxes = []
-        
-        for block in self.blocks:
-            ind = ind + 1
-            if block['type'] == 'net':
-                continue
-            elif block['type'] in ['convolutional', 'upsample']: 
-                x = self.models[ind](x)
-                outputs[ind] = x
-            elif block['type'] == 'route':
-                layers = block['layers'].split(',')
-                layers = [int(i) if int(i) > 0 else int(i)+ind for i in layers]
-                if len(layers) == 1:
-                    x = outputs[layers[0]]
-                    outputs[ind] = x
-                elif len(layers) == 2:
-                    x1 = outputs[layers[0]]
-                    x2 = outputs[layers[1]]
-                    x = torch.cat((x1,x2),1)
-                    outputs[ind] = x
-            elif block['type'] == 'shortcut':
-                from_layer = int(block['from'])
-                activation = block['activation']
-                from_layer = from_layer if from_layer > 0 else from_layer + ind
-                x1 = outputs[from_layer]
-                x2 = outputs[ind-1]
-                x  = x1 + x2
-                outputs[ind] = x
-            elif block['type'] == 'yolo':
-                boxes = self.models[ind](x, nms_thresh)
-                out_boxes.append(boxes)
-            else:
-                print('unknown type %s' % (block['type']))
-            
+        for ind, features in zip(self.yolo_inds, self.forward_features(x)):
+            boxes = self.models[ind](features, nms_thresh)
+            out_boxes.append(boxes)
         return out_boxes
+
+    def forward_features(self, x):
+        # Run the compiled plan and return the raw input of every yolo layer. Each
+        # activation is dropped right after the last step that reads it.
+        outputs = {-1: x}
+        features = []
+        for ind, kind, inputs, release in self.plan:
+            if kind in ['convolutional', 'upsample']:
+                x = self.models[ind](outputs[inputs[0]])
+            elif kind == 'route':
+                if len(inputs) == 1:
+                    x = outputs[inputs[0]]
+                else:
+                    x = torch.cat([outputs[i] for i in inputs], 1)
+            elif kind == 'shortcut':
+                x = outputs[inputs[0]] + outputs[inputs[1]]
+            elif kind == 'yolo':
+                x = outputs[inputs[0]]
+                features.append(x)
+            outputs[ind] = x
+            for i in release:
+                del outputs[i]
+        return tuple(features)
     
 
+    def set_resolution(self, width, height=None):
+        # The network is fully convolutional, so it runs at any multiple of 32 pixels
+        # without touching the cfg. Lower resolutions trade accuracy for speed.
+        height = width if height is None else height
+        assert width % 32 == 0 and height % 32 == 0, 'resolution must be a multiple of 32'
+        self.width = width
+        self.height = height
+        return self
+
+    def fuse(self):
+        # Fold the batchnorm statistics into the preceding convolution for inference, so
+        # every convolutional block becomes Conv2d(bias=True) -> LeakyReLU
+        ind = -2
+        for block in self.blocks:
+            ind = ind + 1
+            if block['type'] == 'convolutional' and int(block['batch_normalize']):
+                model = self.models[ind]
+                if not isinstance(model[1], nn.BatchNorm2d):
+                    continue
+                fused = nn.Sequential()
+                for name, module in model.named_children():
+                    if isinstance(module, nn.Conv2d):
+                        fused.add_module(name, fuse_conv_bn(module, model[1]))
+                    elif not isinstance(module, nn.BatchNorm2d):
+                        fused.add_module(name, module)
+                self.models[ind] = fused
+        return self
+
     def print_network(self):
         print_cfg(self.blocks)
 
-    def create_network(self, blocks):
-        models = nn.ModuleList()
-    
-        prev_filters = 3
-        out_filters =[]
-        prev_stride = 1
-        out_strides = []
-        conv_id = 0
-        for block in blocks:
-            if block['type'] == 'net':
-                prev_filters = int(block['channels'])
-                continue
-            elif block['type'] == 'convolutional':
-                conv_id = conv_id + 1
-                batch_normalize = int(block['batch_normalize'])
-                filters = int(block['filters'])
-                kernel_size = int(block['size'])
-                stride = int(block['stride'])
-                is_pad = int(block['pad'])
-                pad = (kernel_size-1)//2 if is_pad else 0
-                activation = block['activation']
-                model = nn.Sequential()
-                if batch_normalize:
-                    model.add_module('conv{0}'.format(conv_id), nn.Conv2d(prev_filters, filters, kernel_size, stride, pad, bias=False))
-                    model.add_module('bn{0}'.format(conv_id), nn.BatchNorm2d(filters))
-                else:
-                    model.add_module('conv{0}'.format(conv_id), nn.Conv2d(prev_filters, filters, kernel_size, stride, pad))
-                if activation == 'leaky':
-                    model.add_module('leaky{0}'.format(conv_id), nn.LeakyReLU(0.1, inplace=True))
-                prev_filters = filters
-                out_filters.append(prev_filters)
-                prev_stride = stride * prev_stride
-                out_strides.append(prev_stride)
-                models.append(model)
-            elif block['type'] == 'upsample':
-                stride = int(block['stride'])
-                out_filters.append(prev_filters)
-                prev_stride = prev_stride // stride
-                out_strides.append(prev_stride)
-                models.append(Upsample(stride))
-            elif block['type'] == 'route':
-                layers = block['layers'].split(',')
-                ind = len(models)
-                layers = [int(i) if int(i) > 0 else int(i)+ind for i in layers]
-                if len(layers) == 1:
-                    prev_filters = out_filters[layers[0]]
-                    prev_stride = out_strides[layers[0]]
-                elif len(layers) == 2:
-                    assert(layers[0] == ind - 1)
-                    prev_filters = out_filters[layers[0]] + out_filters[layers[1]]
-                    prev_stride = out_strides[layers[0]]
-                out_filters.append(prev_filters)
-                out_strides.append(prev_stride)
-                models.append(EmptyModule())
-            elif block['type'] == 'shortcut':
-                ind = len(models)
-                prev_filters = out_filters[ind-1]
-                out_filters.append(prev_filters)
-                prev_stride = out_strides[ind-1]
-                out_strides.append(prev_stride)
-                models.append(EmptyModule())
-            elif block['type'] == 'yolo':
-                yolo_layer = YoloLayer()
-                anchors = block['anchors'].split(',')
-                anchor_mask = block['mask'].split(',')
-                yolo_layer.anchor_mask = [int(i) for i in anchor_mask]
-                yolo_layer.anchors = [float(i) for i in anchors]
-                yolo_layer.num_classes = int(block['classes'])
-                yolo_layer.num_anchors = int(block['num'])
-                yolo_layer.anchor_step = len(yolo_layer.anchors)//yolo_layer.num_anchors
-                yolo_layer.stride = prev_stride
-                out_filters.append(prev_filters)
-                out_strides.append(prev_stride)
-                models.append(yolo_layer)
-            else:
-                print('unknown type %s' % (block['type']))
-    
-        return models
+    def create_network(self, blocks, device=None):
+        return build_network(network_spec(blocks), device)
 
-    def load_weights(self, weightfile):
+    def load_weights(self, weightfile, mmap=True):
         print()
-        fp = open(weightfile, 'rb')
-        header = np.fromfile(fp, count=5, dtype=np.int32)
-        self.header = torch.from_numpy(header)
-        self.seen = self.header[3]
-        buf = np.fromfile(fp, dtype = np.float32)
-        fp.close()
+        if mmap:
+            # Map the file copy-on-write and let the parameters share the mapped pages,
+            # so the weights are neither read into a temporary buffer nor copied again
+            header = np.memmap(weightfile, dtype=np.int32, mode='r', shape=(5,))
+            self.header = torch.from_numpy(np.array(header))
+            self.seen = self.header[3]
+            buf = np.memmap(weightfile, dtype=np.float32, mode='c', offset=header.nbytes)
+            del header
+        else:
+            fp = open(weightfile, 'rb')
+            header = np.fromfile(fp, count=5, dtype=np.int32)
+            self.header = torch.from_numpy(header)
+            self.seen = self.header[3]
+            buf = np.fromfile(fp, dtype = np.float32)
+            fp.close()
 
         start = 0
         ind = -2
@@ -216,9 +174,10 @@ class Darknet(nn.Module):
                 model = self.models[ind]
                 batch_normalize = int(block['batch_normalize'])
                 if batch_normalize:
-                    start = load_conv_bn(buf, start, model[0], model[1])
+                    assert isinstance(model[1], nn.BatchNorm2d), 'load the weights before calling fuse()'
+                    start = load_conv_bn(buf, start, model[0], model[1], share=mmap)
                 else:
-                    start = load_conv(buf, start, model[0])
+                    start = load_conv(buf, start, model[0], share=mmap)
             elif block['type'] == 'upsample':
                 pass
             elif block['type'] == 'route':
@@ -236,6 +195,9 @@ class Darknet(nn.Module):
 
             counter += 1
 
+        # Layers the file doesn't cover get zeros rather than being left without memory
+        self.models._apply(lambda t: torch.zeros(t.shape, dtype=t.dtype) if t.is_meta else t)
+
             
             
 def convert2cpu(gpu_matrix):
@@ -255,72 +217,205 @@ def get_region_boxes(output, conf_thresh, num_classes, anchors, num_anchors, onl
     h = output.size(2)
     w = output.size(3)
 
-    all_boxes = []
-    output = output.view(batch*num_anchors, 5+num_classes, h*w).transpose(0,1).contiguous().view(5+num_classes, batch*num_anchors*h*w)
-
-    grid_x = torch.linspace(0, w-1, w).repeat(h,1).repeat(batch*num_anchors, 1, 1).view(batch*num_anchors*h*w).type_as(output) #cuda()
-    grid_y = torch.linspace(0, h-1, h).repeat(w,1).t().repeat(batch*num_anchors, 1, 1).view(batch*num_anchors*h*w).type_as(output) #cuda()
-    xs = torch.sigmoid(output[0]) + grid_x
-    ys = torch.sigmoid(output[1]) + grid_y
-
-    anchor_w = torch.Tensor(anchors).view(num_anchors, anchor_step).index_select(1, torch.LongTensor([0]))
-    anchor_h = torch.Tensor(anchors).view(num_anchors, anchor_step).index_select(1, torch.LongTensor([1]))
-    anchor_w = anchor_w.repeat(batch, 1).repeat(1, 1, h*w).view(batch*num_anchors*h*w).type_as(output) #cuda()
-    anchor_h = anchor_h.repeat(batch, 1).repeat(1, 1, h*w).view(batch*num_anchors*h*w).type_as(output) #cuda()
-    ws = torch.exp(output[2]) * anchor_w
-    hs = torch.exp(output[3]) * anchor_h
-
-    det_confs = torch.sigmoid(output[4])
-    cls_confs = torch.nn.Softmax(dim=1)(output[5:5+num_classes].transpose(0,1)).detach()
-    cls_max_confs, cls_max_ids = torch.max(cls_confs, 1)
-    cls_max_confs = cls_max_confs.view(-1)
-    cls_max_ids = cls_max_ids.view(-1)
-
-    
-    sz_hw = h*w
-    sz_hwa = sz_hw*num_anchors
-    det_confs = convert2cpu(det_confs)
-    cls_max_confs = convert2cpu(cls_max_confs)
-    cls_max_ids = convert2cpu_long(cls_max_ids)
-    xs = convert2cpu(xs)
-    ys = convert2cpu(ys)
-    ws = convert2cpu(ws)
-    hs = convert2cpu(hs)
-    if validation:
-        cls_confs = convert2cpu(cls_confs.view(-1, num_classes))
+    # (batch, num_anchors, 5+num_classes, h, w) -> (batch, h*w, num_anchors, 5+num_classes) so that
+    # the packed boxes come out in the same (cy, cx, anchor) order as the per cell decode used to
+    output = output.view(batch, num_anchors, 5+num_classes, h*w).permute(0, 3, 1, 2)
+
+    grid_x = torch.arange(w, dtype=output.dtype, device=output.device).repeat(h).view(1, h*w, 1)
+    grid_y = torch.arange(h, dtype=output.dtype, device=output.device).repeat_interleave(w).view(1, h*w, 1)
+    xs = torch.sigmoid(output[..., 0]) + grid_x
+    ys = torch.sigmoid(output[..., 1]) + grid_y
+
+    anchors = torch.tensor(anchors, dtype=output.dtype, device=output.device).view(num_anchors, anchor_step)
+    ws = torch.exp(output[..., 2]) * anchors[:, 0]
+    hs = torch.exp(output[..., 3]) * anchors[:, 1]
+
+    det_confs = torch.sigmoid(output[..., 4])
+    cls_confs = torch.softmax(output[..., 5:5+num_classes], dim=-1).detach()
+    cls_max_confs, cls_max_ids = torch.max(cls_confs, -1)
+
+    if only_objectness:
+        confs = det_confs
+    else:
+        confs = det_confs * cls_max_confs
+
+    # Every candidate is packed as [x, y, w, h, det_conf, cls_max_conf, cls_max_id]
+    packed = torch.stack([xs/w, ys/h, ws/w, hs/h, det_confs, cls_max_confs, cls_max_ids.type_as(output)], -1)
+    if (not only_objectness) and validation:
+        # Column 7+c holds the confidence of every other class c that passes the threshold
+        # on its own, zero otherwise
+        class_ids = torch.arange(num_classes, device=output.device)
+        extra = (det_confs.unsqueeze(-1) * cls_confs > conf_thresh) & (class_ids != cls_max_ids.unsqueeze(-1))
+        packed = torch.cat([packed, cls_confs * extra], -1)
+    packed = packed.view(batch, h*w*num_anchors, -1)
+    keep = (confs > conf_thresh).reshape(batch, h*w*num_anchors)
 
+    all_boxes = []
     for b in range(batch):
-        boxes = []
-        for cy in range(h):
-            for cx in range(w):
-                for i in range(num_anchors):
-                    ind = b*sz_hwa + i*sz_hw + cy*w + cx
-                    det_conf =  det_confs[ind]
-                    if only_objectness:
-                        conf =  det_confs[ind]
-                    else:
-                        conf = det_confs[ind] * cls_max_confs[ind]
-    
-                    if conf > conf_thresh:
-                        bcx = xs[ind]
-                        bcy = ys[ind]
-                        bw = ws[ind]
-                        bh = hs[ind]
-                        cls_max_conf = cls_max_confs[ind]
-                        cls_max_id = cls_max_ids[ind]
-                        box = [bcx/w, bcy/h, bw/w, bh/h, det_conf, cls_max_conf, cls_max_id]
-                        if (not only_objectness) and validation:
-                            for c in range(num_classes):
-                                tmp_conf = cls_confs[ind][c]
-                                if c != cls_max_id and det_confs[ind]*tmp_conf > conf_thresh:
-                                    box.append(tmp_conf)
-                                    box.append(c)
-                        boxes.append(box)
-        all_boxes.append(boxes)
+        all_boxes.append(packed[b][keep[b]].cpu())
 
     return all_boxes
 
 
+def network_spec(blocks):
+    # Work out the typed layer parameters of every block once: input channels, strides,
+    # padding and the yolo anchors, so building the modules needs no more text parsing
+    spec = []
+    prev_filters = 3
+    out_filters =[]
+    prev_stride = 1
+    out_strides = []
+    conv_id = 0
+    for block in blocks:
+        if block['type'] == 'net':
+            prev_filters = int(block['channels'])
+            continue
+        elif block['type'] == 'convolutional':
+            conv_id = conv_id + 1
+            batch_normalize = int(block['batch_normalize'])
+            filters = int(block['filters'])
+            kernel_size = int(block['size'])
+            stride = int(block['stride'])
+            is_pad = int(block['pad'])
+            pad = (kernel_size-1)//2 if is_pad else 0
+            activation = block['activation']
+            spec.append(('convolutional', conv_id, prev_filters, filters, kernel_size, stride, pad, batch_normalize, activation))
+            prev_filters = filters
+            out_filters.append(prev_filters)
+            prev_stride = stride * prev_stride
+            out_strides.append(prev_stride)
+        elif block['type'] == 'upsample':
+            stride = int(block['stride'])
+            out_filters.append(prev_filters)
+            prev_stride = prev_stride // stride
+            out_strides.append(prev_stride)
+            spec.append(('upsample', stride))
+        elif block['type'] == 'route':
+            layers = block['layers'].split(',')
+            ind = len(spec)
+            layers = [int(i) if int(i) > 0 else int(i)+ind for i in layers]
+            if len(layers) == 1:
+                prev_filters = out_filters[layers[0]]
+                prev_stride = out_strides[layers[0]]
+            elif len(layers) == 2:
+                assert(layers[0] == ind - 1)
+                prev_filters = out_filters[layers[0]] + out_filters[layers[1]]
+                prev_stride = out_strides[layers[0]]
+            out_filters.append(prev_filters)
+            out_strides.append(prev_stride)
+            spec.append(('route',))
+        elif block['type'] == 'shortcut':
+            ind = len(spec)
+            prev_filters = out_filters[ind-1]
+            out_filters.append(prev_filters)
+            prev_stride = out_strides[ind-1]
+            out_strides.append(prev_stride)
+            spec.append(('shortcut',))
+        elif block['type'] == 'yolo':
+            anchor_mask = [int(i) for i in block['mask'].split(',')]
+            anchors = [float(i) for i in block['anchors'].split(',')]
+            spec.append(('yolo', anchor_mask, anchors, int(block['classes']), int(block['num']), prev_stride))
+            out_filters.append(prev_filters)
+            out_strides.append(prev_stride)
+        else:
+            print('unknown type %s' % (block['type']))
+
+    return spec
+
+
+def build_network(spec, device=None):
+    models = nn.ModuleList()
+    for layer in spec:
+        if layer[0] == 'convolutional':
+            _, conv_id, prev_filters, filters, kernel_size, stride, pad, batch_normalize, activation = layer
+            model = nn.Sequential()
+            if batch_normalize:
+                model.add_module('conv{0}'.format(conv_id), nn.Conv2d(prev_filters, filters, kernel_size, stride, pad, bias=False, device=device))
+                model.add_module('bn{0}'.format(conv_id), nn.BatchNorm2d(filters, device=device))
+            else:
+                model.add_module('conv{0}'.format(conv_id), nn.Conv2d(prev_filters, filters, kernel_size, stride, pad, device=device))
+            if activation == 'leaky':
+                model.add_module('leaky{0}'.format(conv_id), nn.LeakyReLU(0.1, inplace=True))
+            models.append(model)
+        elif layer[0] == 'upsample':
+            models.append(Upsample(layer[1]))
+        elif layer[0] in ['route', 'shortcut']:
+            models.append(EmptyModule())
+        elif layer[0] == 'yolo':
+            _, anchor_mask, anchors, num_classes, num_anchors, stride = layer
+            yolo_layer = YoloLayer()
+            yolo_layer.anchor_mask = anchor_mask
+            yolo_layer.anchors = anchors
+            yolo_layer.num_classes = num_classes
+            yolo_layer.num_anchors = num_anchors
+            yolo_layer.anchor_step = len(anchors)//num_anchors
+            yolo_layer.stride = stride
+            models.append(yolo_layer)
+
+    return models
+
+
+def load_cfg(cfgfile, cachedir=None):
+    # Parse the cfg into (blocks, spec, plan). With a cachedir the result is pickled under
+    # the hash of the cfg content, so later processes skip parsing and validation.
+    if cachedir is None:
+        blocks = parse_cfg(cfgfile)
+        return blocks, network_spec(blocks), compile_plan(blocks)
+
+    with open(cfgfile, 'rb') as fp:
+        digest = hashlib.sha1(fp.read()).hexdigest()
+    cachefile = os.path.join(cachedir, '{}-{}.pkl'.format(os.path.basename(cfgfile), digest))
+    if os.path.exists(cachefile):
+        with open(cachefile, 'rb') as fp:
+            return pickle.load(fp)
+
+    blocks = parse_cfg(cfgfile)
+    parsed = (blocks, network_spec(blocks), compile_plan(blocks))
+    os.makedirs(cachedir, exist_ok=True)
+    tmpfile = '{}.{}.tmp'.format(cachefile, os.getpid())
+    with open(tmpfile, 'wb') as fp:
+        pickle.dump(parsed, fp, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmpfile, cachefile)
+    return parsed
+
+
+def compile_plan(blocks):
+    # Turn the blocks into a list of (ind, type, inputs, release) steps, where inputs are the
+    # indices of the outputs a step reads (-1 is the network input) and release lists the
+    # outputs nobody reads after this step
+    plan = []
+    ind = -2
+    for block in blocks:
+        ind = ind + 1
+        if block['type'] == 'net':
+            continue
+        elif block['type'] in ['convolutional', 'upsample', 'yolo']:
+            inputs = [ind-1]
+        elif block['type'] == 'route':
+            layers = block['layers'].split(',')
+            inputs = [int(i) if int(i) > 0 else int(i)+ind for i in layers]
+        elif block['type'] == 'shortcut':
+            from_layer = int(block['from'])
+            from_layer = from_layer if from_layer > 0 else from_layer + ind
+            inputs = [from_layer, ind-1]
+        else:
+            print('unknown type %s' % (block['type']))
+            continue
+        plan.append((ind, block['type'], inputs, []))
+
+    # Liveness analysis: an output is released after its last reader, or right away
+    # if nothing reads it. The network input is released like any other output.
+    last_use = {-1: 0}
+    for step, (ind, _, inputs, _) in enumerate(plan):
+        last_use[ind] = step
+        for i in inputs:
+            last_use[i] = step
+    for i, step in sorted(last_use.items()):
+        plan[step][3].append(i)
+
+    return plan
+
+
 def parse_cfg(cfgfile):
     blocks = []
     fp = open(cfgfile, 'r')
@@ -433,20 +528,43 @@ def print_cfg(blocks):
             print('unknown type %s' % (block['type']))
 
             
-def load_conv(buf, start, conv_model):
+def fuse_conv_bn(conv_model, bn_model):
+    scale = bn_model.weight.data / torch.sqrt(bn_model.running_var + bn_model.eps)
+    fused = nn.Conv2d(conv_model.in_channels, conv_model.out_channels, conv_model.kernel_size,
+                      conv_model.stride, conv_model.padding, bias=True)
+    fused.weight.data.copy_(conv_model.weight.data * scale.view(-1, 1, 1, 1))
+    bias = conv_model.bias.data if conv_model.bias is not None else torch.zeros_like(bn_model.running_mean)
+    fused.bias.data.copy_((bias - bn_model.running_mean) * scale + bn_model.bias.data)
+    return fused.to(conv_model.weight.device)
+
+
+def load_param(module, name, values, share=False):
+    # Either let the parameter or buffer use the memory of values as it is, or copy values
+    # into it. Parameters still on the meta device have no memory to copy into.
+    param = getattr(module, name)
+    values = torch.from_numpy(values).view(param.shape)
+    if param.is_meta or (share and param.device == values.device and param.dtype == values.dtype):
+        if isinstance(param, nn.Parameter):
+            values = nn.Parameter(values, requires_grad=param.requires_grad)
+        setattr(module, name, values)
+    else:
+        param.data.copy_(values)
+
+
+def load_conv(buf, start, conv_model, share=False):
     num_w = conv_model.weight.numel()
     num_b = conv_model.bias.numel()
-    conv_model.bias.data.copy_(torch.from_numpy(buf[start:start+num_b]));   start = start + num_b
-    conv_model.weight.data.copy_(torch.from_numpy(buf[start:start+num_w]).view_as(conv_model.weight.data)); start = start + num_w
+    load_param(conv_model, 'bias', buf[start:start+num_b], share);   start = start + num_b
+    load_param(conv_model, 'weight', buf[start:start+num_w], share); start = start + num_w
     return start
 
 
-def load_conv_bn(buf, start, conv_model, bn_model):
+def load_conv_bn(buf, start, conv_model, bn_model, share=False):
     num_w = conv_model.weight.numel()
     num_b = bn_model.bias.numel()
-    bn_model.bias.data.copy_(torch.from_numpy(buf[start:start+num_b]));     start = start + num_b
-    bn_model.weight.data.copy_(torch.from_numpy(buf[start:start+num_b]));   start = start + num_b
-    bn_model.running_mean.copy_(torch.from_numpy(buf[start:start+num_b]));  start = start + num_b
-    bn_model.running_var.copy_(torch.from_numpy(buf[start:start+num_b]));   start = start + num_b
-    conv_model.weight.data.copy_(torch.from_numpy(buf[start:start+num_w]).view_as(conv_model.weight.data)); start = start + num_w
+    load_param(bn_model, 'bias', buf[start:start+num_b], share);         start = start + num_b
+    load_param(bn_model, 'weight', buf[start:start+num_b], share);       start = start + num_b
+    load_param(bn_model, 'running_mean', buf[start:start+num_b], share); start = start + num_b
+    load_param(bn_model, 'running_var', buf[start:start+num_b], share);  start = start + num_b
+    load_param(conv_model, 'weight', buf[start:start+num_w], share);     start = start + num_w
     return start
@@ -0,0 +1,222 @@
+import time
+import queue
+import threading
+import cv2
+import numpy as np
+import torch
+from utils import nms, boxes_to_list, letterbox, scale_boxes
+
+
+# Marks the end of the stream as it travels through the queues
+END_OF_STREAM = object()
+
+
+def read_video_frames(videofile):
+
+    # Read the BGR frames of a video file one by one
+    cap = cv2.VideoCapture(videofile)
+    try:
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            yield frame
+    finally:
+        cap.release()
+
+
+class StageStats(object):
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.busy_time = 0.0
+
+    def add(self, elapsed, items = 1):
+        self.items += items
+        self.busy_time += elapsed
+
+    def latency(self):
+        # Mean time in seconds the stage spends on one frame
+        return self.busy_time / self.items if self.items else 0.0
+
+
+class DetectionPipeline(object):
+    def __init__(self, model, iou_thresh, nms_thresh, batch_size = 4, queue_size = 8, use_letterbox = False,
+                 class_aware = False):
+        self.model = model
+        self.use_letterbox = use_letterbox
+        self.class_aware = class_aware
+        self.iou_thresh = iou_thresh
+        self.nms_thresh = nms_thresh
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.stats = []
+        self.frames = 0
+        self.elapsed = 0.0
+
+    def run(self, frames, sink = None):
+
+        # frames is a path to a video file or any iterable of BGR frames. The sink is called
+        # as sink(index, frame, boxes) for every frame in order. A slow sink fills up the
+        # bounded queues, which blocks the upstream stages instead of buffering frames.
+        # With class_aware only boxes of the same class suppress each other, like in
+        # detect_objects. With use_letterbox the boxes are in pixels of the frame. The
+        # network resolution can be changed with model.set_resolution while the pipeline
+        # is running.
+        if isinstance(frames, str):
+            frames = read_video_frames(frames)
+
+        self.model.eval()
+        self.stats = [StageStats(name) for name in ['read', 'preprocess', 'inference', 'nms', 'sink']]
+        self._stop = threading.Event()
+        self._errors = []
+        queues = [queue.Queue(maxsize = self.queue_size) for _ in range(4)]
+        read_stats, pre_stats, inf_stats, nms_stats, sink_stats = self.stats
+        workers = [
+            threading.Thread(target = self._guard, args = (self._read, frames, queues[0], read_stats)),
+            threading.Thread(target = self._guard, args = (self._preprocess, queues[0], queues[1], pre_stats)),
+            threading.Thread(target = self._guard, args = (self._infer, queues[1], queues[2], inf_stats)),
+            threading.Thread(target = self._guard, args = (self._nms, queues[2], queues[3], nms_stats)),
+            threading.Thread(target = self._guard, args = (self._sink, queues[3], sink, sink_stats)),
+        ]
+
+        start = time.time()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.elapsed = time.time() - start
+
+        if self._errors:
+            raise self._errors[0]
+
+        return self.report()
+
+    def fps(self):
+        return self.frames / self.elapsed if self.elapsed else 0.0
+
+    def report(self):
+        report = {stats.name: stats.latency() for stats in self.stats}
+        report['fps'] = self.fps()
+        return report
+
+    def print_report(self):
+        for stats in self.stats:
+            print('{:<12}{:8.2f} ms/frame'.format(stats.name, stats.latency() * 1000))
+        print('{} frames in {:.3f} seconds, {:.2f} frames/sec'.format(self.frames, self.elapsed, self.fps()))
+
+    def _guard(self, stage, *args):
+
+        # A failing stage stops all the others, so that none of them blocks forever on a queue
+        try:
+            stage(*args)
+        except Exception as e:
+            self._errors.append(e)
+            self._stop.set()
+
+    def _put(self, q, item):
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout = 0.1)
+                return
+            except queue.Full:
+                pass
+
+    def _get(self, q):
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout = 0.1)
+            except queue.Empty:
+                pass
+        return END_OF_STREAM
+
+    def _read(self, frames, out_q, stats):
+        index = 0
+        frames = iter(frames)
+        while not self._stop.is_set():
+            start = time.time()
+            frame = next(frames, END_OF_STREAM)
+            if frame is END_OF_STREAM:
+                break
+            stats.add(time.time() - start)
+            self._put(out_q, (index, frame))
+            index += 1
+        self._put(out_q, END_OF_STREAM)
+
+    def _preprocess(self, in_q, out_q, stats):
+        while True:
+            item = self._get(in_q)
+            if item is END_OF_STREAM:
+                break
+            start = time.time()
+            index, frame = item
+
+            # Resize the frame to the current network size and convert it from BGR to RGB
+            width, height = self.model.width, self.model.height
+            if self.use_letterbox:
+                resized, params = letterbox(frame, width, height)
+            else:
+                resized, params = cv2.resize(frame, (width, height)), None
+            resized = cv2.cvtColor(resized, cv2.COLOR_BGR2RGB)
+            stats.add(time.time() - start)
+            self._put(out_q, (index, frame, resized, params))
+        self._put(out_q, END_OF_STREAM)
+
+    def _infer(self, in_q, out_q, stats):
+        done = False
+        pending = None
+        while not done or pending is not None:
+
+            # Collect up to batch_size frames of the same size for a single forward pass. A
+            # frame preprocessed at a new resolution starts the next batch.
+            batch = [pending] if pending is not None else []
+            pending = None
+            while not done and len(batch) < self.batch_size:
+                item = self._get(in_q)
+                if item is END_OF_STREAM:
+                    done = True
+                    break
+                if batch and item[2].shape != batch[0][2].shape:
+                    pending = item
+                    break
+                batch.append(item)
+            if not batch:
+                break
+
+            start = time.time()
+            images = np.stack([resized for _, _, resized, _ in batch])
+            img = torch.from_numpy(images.transpose(0,3,1,2)).float().div(255.0)
+            with torch.no_grad():
+                list_boxes = self.model(img, self.nms_thresh)
+            stats.add(time.time() - start, len(batch))
+
+            for b, (index, frame, resized, params) in enumerate(batch):
+                self._put(out_q, (index, frame, [head_boxes[b] for head_boxes in list_boxes], params, resized.shape))
+        self._put(out_q, END_OF_STREAM)
+
+    def _nms(self, in_q, out_q, stats):
+        while True:
+            item = self._get(in_q)
+            if item is END_OF_STREAM:
+                break
+            start = time.time()
+            index, frame, head_boxes, params, shape = item
+            boxes = nms(torch.cat(head_boxes), self.iou_thresh, self.class_aware)
+            if params is not None:
+                boxes = scale_boxes(boxes, params, shape[1], shape[0])
+            boxes = boxes_to_list(boxes)
+            stats.add(time.time() - start)
+            self._put(out_q, (index, frame, boxes))
+        self._put(out_q, END_OF_STREAM)
+
+    def _sink(self, in_q, sink, stats):
+        self.frames = 0
+        while True:
+            item = self._get(in_q)
+            if item is END_OF_STREAM:
+                break
+            start = time.time()
+            if sink is not None:
+                sink(*item)
+            stats.add(time.time() - start)
+            self.frames += 1
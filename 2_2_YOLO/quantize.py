@@ -0,0 +1,60 @@
+import os
+import copy
+import cv2
+import torch
+import torch.nn as nn
+from torch.ao.quantization import QuantStub, DeQuantStub, get_default_qconfig, prepare, convert
+from utils import letterbox_batch
+
+
+class QuantizedBlock(nn.Module):
+    # Runs one convolutional block in int8. The route, shortcut, upsample and yolo
+    # layers stay in fp32, so the activations are quantized at the block boundary.
+    def __init__(self, block):
+        super(QuantizedBlock, self).__init__()
+        self.quant = QuantStub()
+        self.block = block
+        self.dequant = DeQuantStub()
+
+    def forward(self, x):
+        return self.dequant(self.block(self.quant(x)))
+
+
+def load_calibration_images(imagedir, width, height, count=8):
+
+    # Letterbox the first count images of the directory to the network size
+    images = []
+    for name in sorted(os.listdir(imagedir))[:count]:
+        img = cv2.imread(os.path.join(imagedir, name))
+        if img is not None:
+            images.append(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+    batch, _ = letterbox_batch(images, width, height)
+    return torch.from_numpy(batch.transpose(0,3,1,2)).float().div(255.0)
+
+
+def quantize_model(model, calibration, backend=None, batch_size=4):
+
+    # Post-training static quantization of a loaded Darknet. The batchnorm is folded
+    # first, then every convolutional block is observed on the calibration batch
+    # (a tensor of shape N x 3 x H x W) and converted to int8.
+    backend = backend or torch.backends.quantized.engine
+    torch.backends.quantized.engine = backend
+
+    qmodel = copy.deepcopy(model).eval().fuse()
+    qconfig = get_default_qconfig(backend)
+    for module in qmodel.modules():
+        if isinstance(module, nn.LeakyReLU):
+            # The quantized leaky relu can't run in place
+            module.inplace = False
+    for ind, block in enumerate(qmodel.blocks[1:]):
+        if block['type'] == 'convolutional':
+            qmodel.models[ind] = QuantizedBlock(qmodel.models[ind])
+            qmodel.models[ind].qconfig = qconfig
+
+    prepare(qmodel, inplace=True)
+    with torch.no_grad():
+        for start in range(0, calibration.size(0), batch_size):
+            qmodel.forward_features(calibration[start:start+batch_size])
+    convert(qmodel, inplace=True)
+
+    return qmodel
@@ -1,4 +1,5 @@
 import time
+import cv2
 import torch
 import numpy as np
 import matplotlib.pyplot as plt
@@ -51,54 +52,113 @@ def boxes_iou(box1, box2):
     return iou
 
 
-def nms(boxes, iou_thresh):
+def boxes_iou_matrix(boxes_a, boxes_b):
+    
+    # Both inputs are tensors of shape (N, >=4) and (M, >=4) holding bounding boxes
+    # in the (x, y, w, h) center format. Compute the corners of every bounding box.
+    a_x1 = boxes_a[:, 0] - boxes_a[:, 2]/2.0
+    a_y1 = boxes_a[:, 1] - boxes_a[:, 3]/2.0
+    a_x2 = boxes_a[:, 0] + boxes_a[:, 2]/2.0
+    a_y2 = boxes_a[:, 1] + boxes_a[:, 3]/2.0
+    b_x1 = boxes_b[:, 0] - boxes_b[:, 2]/2.0
+    b_y1 = boxes_b[:, 1] - boxes_b[:, 3]/2.0
+    b_x2 = boxes_b[:, 0] + boxes_b[:, 2]/2.0
+    b_y2 = boxes_b[:, 1] + boxes_b[:, 3]/2.0
+    
+    # Calculate the area of each bounding box
+    area_a = boxes_a[:, 2] * boxes_a[:, 3]
+    area_b = boxes_b[:, 2] * boxes_b[:, 3]
+    
+    # Broadcast the corners against each other to get the width and height of the
+    # area of intersection of every pair of bounding boxes in one go. Pairs that
+    # don't overlap are clamped to zero so their IOU is zero.
+    intersection_width = (torch.min(a_x2[:, None], b_x2[None, :]) - torch.max(a_x1[:, None], b_x1[None, :])).clamp(min = 0)
+    intersection_height = (torch.min(a_y2[:, None], b_y2[None, :]) - torch.max(a_y1[:, None], b_y1[None, :])).clamp(min = 0)
+    intersection_area = intersection_width * intersection_height
+    
+    # Calculate the area of the union of every pair of bounding boxes
+    union_area = area_a[:, None] + area_b[None, :] - intersection_area
+    
+    # Calculate the IOU matrix of shape (N, M). Boxes without any area have an
+    # empty union, for those we report an IOU of zero.
+    iou = torch.where(union_area > 0, intersection_area / union_area.clamp(min = 1e-12), torch.zeros_like(union_area))
+    
+    return iou
+
+
+def nms_indices(boxes, iou_thresh, class_aware = False):
+    
+    # boxes is a tensor of shape (N, 7) holding (x, y, w, h, det_conf, cls_conf, cls_id)
+    # for every bounding box. The tensor is never modified.
+    if boxes.size(0) == 0:
+        return torch.zeros(0, dtype = torch.long, device = boxes.device)
+    
+    # Sort the indices of the bounding boxes by detection confidence value in descending order
+    # and drop the bounding boxes whose detection confidence is zero
+    det_confs = boxes[:, 4]
+    sortIds = torch.argsort(det_confs, descending = True)
+    sortIds = sortIds[det_confs[sortIds] > 0]
+    sorted_boxes = boxes[sortIds]
+    
+    # Calculate the IOU of every pair of the sorted bounding boxes in one batched operation.
+    # Only the pairs whose IOU is higher than the given IOU threshold can suppress each other.
+    overlaps = boxes_iou_matrix(sorted_boxes, sorted_boxes) > iou_thresh
+    
+    # For class aware suppression a bounding box can only suppress the bounding boxes
+    # predicted for the same object class
+    if class_aware:
+        cls_ids = sorted_boxes[:, 6]
+        overlaps &= cls_ids[:, None] == cls_ids[None, :]
+    
+    # Perform Non-Maximal Suppression. Each kept bounding box suppresses its whole row
+    # of the overlap matrix at once, so only one pass over the sorted boxes is needed.
+    # The pass runs on the CPU, wherever the bounding boxes are.
+    overlaps = overlaps.cpu().numpy()
+    suppressed = np.zeros(sorted_boxes.size(0), dtype = bool)
+    keep = []
+    for i in range(sorted_boxes.size(0)):
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        suppressed |= overlaps[i]
+    
+    return sortIds[torch.as_tensor(keep, dtype = torch.long, device = sortIds.device)]
+
+
+def nms(boxes, iou_thresh, class_aware = False):
     
     # If there are no bounding boxes do nothing
     if len(boxes) == 0:
         return boxes
     
-    # Create a PyTorch Tensor to keep track of the detection confidence
-    # of each predicted bounding box
-    det_confs = torch.zeros(len(boxes))
-    
-    # Get the detection confidence of each predicted bounding box
-    for i in range(len(boxes)):
-        det_confs[i] = boxes[i][4]
-
-    # Sort the indices of the bounding boxes by detection confidence value in descending order.
-    # We ignore the first returned element since we are only interested in the sorted indices
-    _,sortIds = torch.sort(det_confs, descending = True)
+    # Packed bounding boxes can go straight to the NMS engine
+    if torch.is_tensor(boxes):
+        return boxes[nms_indices(boxes, iou_thresh, class_aware)]
     
-    # Create an empty list to hold the best bounding boxes after
-    # Non-Maximal Suppression (NMS) is performed
-    best_boxes = []
+    # Pack the first 7 parameters of the list of bounding boxes into a tensor of shape (N, 7)
+    packed = torch.tensor([[float(v) for v in box[:7]] for box in boxes])
     
-    # Perform Non-Maximal Suppression 
-    for i in range(len(boxes)):
-        
-        # Get the bounding box with the highest detection confidence first
-        box_i = boxes[sortIds[i]]
+    # Keep the best bounding boxes in descending order of detection confidence
+    return [boxes[i] for i in nms_indices(packed, iou_thresh, class_aware).tolist()]
+
+
+def boxes_to_list(boxes):
+    
+    # Convert a packed tensor of bounding boxes of shape (N, 7+) back to a list of bounding
+    # boxes, where each bounding box is [x, y, w, h, det_conf, cls_conf, cls_id] followed by
+    # (cls_conf, cls_id) pairs for any other object class that passed the threshold
+    box_list = []
+    for row in boxes.tolist():
+        box = row[:6] + [int(row[6])]
+        for c, cls_conf in enumerate(row[7:]):
+            if cls_conf > 0:
+                box += [cls_conf, c]
+        box_list.append(box)
         
-        # Check that the detection confidence is not zero
-        if box_i[4] > 0:
-            
-            # Save the bounding box 
-            best_boxes.append(box_i)
-            
-            # Go through the rest of the bounding boxes in the list and calculate their IOU with
-            # respect to the previous selected box_i. 
-            for j in range(i + 1, len(boxes)):
-                box_j = boxes[sortIds[j]]
-                
-                # If the IOU of box_i and box_j is higher than the given IOU threshold set
-                # box_j's detection confidence to zero. 
-                if boxes_iou(box_i, box_j) > iou_thresh:
-                    box_j[4] = 0
-                    
-    return best_boxes
+    return box_list
 
 
-def detect_objects(model, img, iou_thresh, nms_thresh):
+def detect_objects(model, img, iou_thresh, nms_thresh, class_aware = False, use_letterbox = False):
     
     # Start the time. This is done to calculate how long the detection takes.
     start = time.time()
@@ -106,6 +166,11 @@ def detect_objects(model, img, iou_thresh, nms_thresh):
     # Set the model to evaluation mode.
     model.eval()
     
+    # Either the image is already resized to the network size, or it can have any size
+    # and gets letterboxed to the current network resolution, like in detect_objects_batch.
+    if use_letterbox:
+        img, params = letterbox(img, model.width, model.height)
+    
     # Convert the image from a NumPy ndarray to a PyTorch Tensor of the correct shape.
     # The image is transposed, then converted to a FloatTensor of dtype float32, then
     # Normalized to values between 0 and 1, and finally unsqueezed to have the correct
@@ -118,13 +183,18 @@ def detect_objects(model, img, iou_thresh, nms_thresh):
     # the given NMS threshold will be removed.
     list_boxes = model(img, nms_thresh)
     
-    # Make a new list with all the bounding boxes returned by the neural network
-    boxes = list_boxes[0][0] + list_boxes[1][0] + list_boxes[2][0]
+    # Stack all the packed bounding boxes returned by the YOLO layers of the neural network
+    boxes = torch.cat([head_boxes[0] for head_boxes in list_boxes])
     
     # Perform the second step of NMS on the bounding boxes returned by the neural network.
     # In this step, we only keep the best bounding boxes by eliminating all the bounding boxes
-    # whose IOU value is higher than the given IOU threshold
-    boxes = nms(boxes, iou_thresh)
+    # whose IOU value is higher than the given IOU threshold. With class_aware only bounding
+    # boxes of the same object class suppress each other. Letterboxed bounding boxes are
+    # returned in pixels of the original image.
+    boxes = nms(boxes, iou_thresh, class_aware)
+    if use_letterbox:
+        boxes = scale_boxes(boxes, params, model.width, model.height)
+    boxes = boxes_to_list(boxes)
     
     # Stop the time. 
     finish = time.time()
@@ -138,6 +208,111 @@ def detect_objects(model, img, iou_thresh, nms_thresh):
     return boxes
 
 
+def batch_images(images, batch_size):
+    
+    # Group a stack of images of shape (N, H, W, 3) or any iterable of HWC images into
+    # lists of batch_size images. The last batch may be smaller.
+    batch = []
+    for img in images:
+        batch.append(img)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def letterbox(img, width, height, out = None):
+    
+    # Resize the image to fit inside width x height while keeping its aspect ratio, and
+    # pad the rest of the canvas with gray. The canvas can be a preallocated array.
+    img_height, img_width = img.shape[:2]
+    scale = min(width / img_width, height / img_height)
+    new_width = int(round(img_width * scale))
+    new_height = int(round(img_height * scale))
+    pad_x = (width - new_width) // 2
+    pad_y = (height - new_height) // 2
+    
+    if out is None:
+        out = np.empty((height, width, 3), dtype = np.uint8)
+    out.fill(128)
+    out[pad_y:pad_y + new_height, pad_x:pad_x + new_width] = cv2.resize(img, (new_width, new_height))
+    
+    return out, (scale, pad_x, pad_y)
+
+
+def letterbox_batch(images, width, height):
+    
+    # Letterbox a list of images of any size straight into one preallocated batch of
+    # shape B x height x width x 3, and keep the (scale, pad_x, pad_y) of every image
+    batch = np.empty((len(images), height, width, 3), dtype = np.uint8)
+    params = np.empty((len(images), 3))
+    for b, img in enumerate(images):
+        _, params[b] = letterbox(img, width, height, out = batch[b])
+    
+    return batch, params
+
+
+def scale_boxes(boxes, params, width, height):
+    
+    # Map a packed tensor of bounding boxes, normalized to a letterboxed network input of
+    # width x height, back to the pixel coordinates of the original image
+    scale, pad_x, pad_y = params
+    boxes = boxes.clone()
+    boxes[:, 0] = (boxes[:, 0] * width - pad_x) / scale
+    boxes[:, 1] = (boxes[:, 1] * height - pad_y) / scale
+    boxes[:, 2] = boxes[:, 2] * width / scale
+    boxes[:, 3] = boxes[:, 3] * height / scale
+    
+    return boxes
+
+
+def detect_objects_batch(model, images, iou_thresh, nms_thresh, batch_size = 8, use_letterbox = False, class_aware = False):
+    
+    # Start the time. This is done to calculate how long the detection takes.
+    start = time.time()
+    
+    # Set the model to evaluation mode.
+    model.eval()
+    
+    # Create an empty list to hold the bounding boxes found in each image
+    all_boxes = []
+    
+    for batch in batch_images(images, batch_size):
+        
+        # Either the images are already resized to the network size, or they can have any
+        # size and get letterboxed to the current network resolution.
+        if use_letterbox:
+            batch, params = letterbox_batch(batch, model.width, model.height)
+        else:
+            batch = np.stack(batch)
+        
+        # Convert the batch of images from a NumPy ndarray of shape B x 416 x 416 x 3 to
+        # a normalized PyTorch FloatTensor of shape B x 3 x 416 x 416
+        img = torch.from_numpy(batch.transpose(0,3,1,2)).float().div(255.0)
+        
+        # Feed the whole batch to the neural network in a single forward pass
+        with torch.no_grad():
+            list_boxes = model(img, nms_thresh)
+        
+        # Each YOLO layer returns one packed tensor of bounding boxes per image. Stack the
+        # bounding boxes of each image and perform the second step of NMS on them.
+        # Letterboxed bounding boxes are returned in pixels of the original image.
+        for b in range(batch.shape[0]):
+            boxes = nms(torch.cat([head_boxes[b] for head_boxes in list_boxes]), iou_thresh, class_aware)
+            if use_letterbox:
+                boxes = scale_boxes(boxes, params[b], model.width, model.height)
+            all_boxes.append(boxes_to_list(boxes))
+    
+    # Stop the time. 
+    finish = time.time()
+    
+    # Print the time it took to detect objects
+    print('\n\nIt took {:.3f}'.format(finish - start), 'seconds to detect the objects in', len(all_boxes), 'images.\n')
+    
+    return all_boxes
+
+
 def load_class_names(namesfile):
     
     # Create an empty list to hold the object classes
@@ -172,7 +347,7 @@ def print_objects(boxes, class_names):
             print('%i. %s: %f' % (i + 1, class_names[cls_id], cls_conf))
 
             
-def plot_boxes(img, boxes, class_names, plot_labels, color = None):
+def plot_boxes(img, boxes, class_names, plot_labels, color = None, pixels = False):
     
     # Define a tensor used to set the colors of the bounding boxes
     colors = torch.FloatTensor([[1,0,1],[0,0,1],[0,1,1],[0,1,0],[1,1,0],[1,0,0]])
@@ -188,9 +363,12 @@ def plot_boxes(img, boxes, class_names, plot_labels, color = None):
         
         return int(r * 255)
     
-    # Get the width and height of the image
+    # Get the width and height of the image. Bounding boxes already given in
+    # pixels don't need to be scaled by them.
     width = img.shape[1]
     height = img.shape[0]
+    box_width = 1 if pixels else width
+    box_height = 1 if pixels else height
     
     # Create a figure and plot the image
     fig, a = plt.subplots(1,1)
@@ -204,10 +382,10 @@ def plot_boxes(img, boxes, class_names, plot_labels, color = None):
         
         # Get the (x,y) pixel coordinates of the lower-left and lower-right corners
         # of the bounding box relative to the size of the image. 
-        x1 = int(np.around((box[0] - box[2]/2.0) * width))
-        y1 = int(np.around((box[1] - box[3]/2.0) * height))
-        x2 = int(np.around((box[0] + box[2]/2.0) * width))
-        y2 = int(np.around((box[1] + box[3]/2.0) * height))
+        x1 = int(np.around((box[0] - box[2]/2.0) * box_width))
+        y1 = int(np.around((box[1] - box[3]/2.0) * box_height))
+        x2 = int(np.around((box[0] + box[2]/2.0) * box_width))
+        y2 = int(np.around((box[1] + box[3]/2.0) * box_height))
         
         # Set the default rgb value to red
         rgb = (1, 0, 0)
@@ -0,0 +1,214 @@
+from typing import Dict, List, Tuple, Union
+import numpy as np
+from helpers import as_window, separate_window, wrap_pad, convolve_padded, are_robots_localized
+from world import World
+
+
+class BatchSimulation(object):
+    """Simulates many robots localizing themselves in the same world
+    at once. Every robot has its own belief and true pose, and every
+    step senses and moves all robots with vectorized array operations.
+    The beliefs are double buffered like in Simulation, all arrays a
+    step needs are allocated up front.
+
+    Attributes:
+        grid: 2D array of colors representing the robot world
+        colors: All colors of the world
+        labels: 2D array of the index of the color of every cell
+        beliefs: Beliefs of all robots, of shape (num_robots, height, width)
+        true_poses: True (y, x) positions of all robots, of shape (num_robots, 2)
+        blur: Blurring factor or window of the motion noise
+        p_hit: Factor to consider if the measurement is correct
+        p_miss: Factor to consider if the measurement is incorrect
+        incorrect_sense_probability: Probability of observing a wrong color
+        rng: Random number generator of the simulation
+    """
+
+    grid: np.ndarray
+    colors: List[str]
+    labels: np.ndarray
+    beliefs: np.ndarray
+    true_poses: np.ndarray
+    height: int
+    width: int
+    num_robots: int
+    blur: Union[float, np.ndarray]
+    p_hit: float
+    p_miss: float
+    incorrect_sense_probability: float
+    rng: np.random.Generator
+
+    def __init__(self, grid: List[List[str]], blur: Union[float, np.ndarray], p_hit: float,
+                 num_robots: int, start_poses: np.ndarray = None, seed: int = None) -> None:
+        """Initializes BatchSimulation
+
+        Args:
+            grid: 2D grid representing the robot world
+            blur: Blurring factor or window of the motion noise
+            p_hit: Factor to consider if the measurement is correct
+            num_robots: Number of robots to simulate
+            start_poses: Optional (num_robots, 2) array of starting
+            positions, by default every robot starts at the center
+            of the world
+            seed: Seed of the random number generator
+        """
+        self.grid = np.asarray(grid)
+        self.height, self.width = self.grid.shape
+        world: World = World(grid)
+        self.colors = world.colors
+        self.labels = world.labels
+        self.num_robots = num_robots
+        self.blur = blur
+        self.p_hit = p_hit
+        self.p_miss = 1.0
+        self.incorrect_sense_probability = self.p_miss / (p_hit + self.p_miss)
+        self.rng = np.random.default_rng(seed)
+        self.beliefs = np.full((num_robots, self.height, self.width), 1.0 / (self.height * self.width))
+        # Likelihood grid of every observable color, stacked by label
+        self._likelihoods: np.ndarray = np.stack([world.likelihood(color, p_hit, self.p_miss) for color in self.colors])
+        self.prepare_buffers()
+        if start_poses is None:
+            self.true_poses = np.tile([self.height // 2, self.width // 2], (num_robots, 1))
+        else:
+            self.true_poses = np.array(start_poses, dtype=np.int64).reshape(num_robots, 2)
+
+    def get_observed_labels(self) -> np.ndarray:
+        """Simulates a color observation for every robot. With the
+        incorrect sense probability a robot observes one of the other
+        colors, chosen uniformly.
+
+        Returns:
+            Array of the observed color labels of all robots
+        """
+        true_labels: np.ndarray = self.labels[self.true_poses[:, 0], self.true_poses[:, 1]]
+        num_colors: int = len(self.colors)
+        if num_colors < 2:
+            return true_labels
+        wrong: np.ndarray = self.rng.random(self.num_robots) < self.incorrect_sense_probability
+        offsets: np.ndarray = self.rng.integers(1, num_colors, self.num_robots)
+        return np.where(wrong, (true_labels + offsets) % num_colors, true_labels)
+
+    def prepare_buffers(self) -> None:
+        """Allocates the back buffer, the wrap padded grids and the
+        scratch arrays of the steps. A separable window is applied
+        as a column and then a row vector, which needs an extra grid
+        padded only horizontally.
+        """
+        self._window: np.ndarray = as_window(self.blur)
+        cy: int = self._window.shape[0] // 2
+        cx: int = self._window.shape[1] // 2
+        if cy > self.height or cx > self.width:
+            raise ValueError(f'The {self._window.shape[0]}x{self._window.shape[1]} window is larger than the world')
+        shape: Tuple[int, int, int] = (self.num_robots, self.height, self.width)
+        self._back: np.ndarray = np.empty(shape)
+        self._scratch: np.ndarray = np.empty(shape)
+        self._padded: np.ndarray = np.empty((self.num_robots, self.height + 2 * cy, self.width + 2 * cx))
+        self._center: np.ndarray = self._padded[:, cy:cy+self.height, cx:cx+self.width]
+        self._vectors: Tuple[np.ndarray, np.ndarray] = None
+        if min(self._window.shape) > 1:
+            self._vectors = separate_window(self._window)
+        if self._vectors is not None:
+            self._vertical: np.ndarray = np.empty((self.num_robots, self.height, self.width + 2 * cx))
+            self._vertical_scratch: np.ndarray = np.empty_like(self._vertical)
+
+    def sense(self) -> None:
+        """Updates the beliefs of all robots with their observations"""
+        observed: np.ndarray = self.get_observed_labels()
+        np.take(self._likelihoods, observed, axis=0, out=self._scratch)
+        self.beliefs *= self._scratch
+        self.beliefs /= self.beliefs.sum(axis=(1, 2), keepdims=True)
+
+    def shift_into(self, steps: np.ndarray, out: np.ndarray) -> np.ndarray:
+        """Shifts every belief cyclically by its own step, like
+        helpers.roll_into. The robots taking the same step are shifted
+        together, block by block, so that whole rows are copied
+        instead of gathering every cell on its own.
+
+        Args:
+            steps: Array of (dy, dx) steps of shape (num_robots, 2)
+            out: Array of the shape of the beliefs for the result
+
+        Returns:
+            The shifted beliefs
+        """
+        height, width = self.height, self.width
+        keys: np.ndarray = (steps[:, 0] % height) * width + steps[:, 1] % width
+        order: np.ndarray = np.argsort(keys, kind='stable')
+        unique_keys, starts = np.unique(keys[order], return_index=True)
+        for key, robots in zip(unique_keys.tolist(), np.split(order, starts[1:])):
+            dy, dx = divmod(key, width)
+            if len(robots) == self.num_robots:
+                robots = slice(None)
+            for src_y, dst_y in [(slice(0, height - dy), slice(dy, height)), (slice(height - dy, height), slice(0, dy))]:
+                for src_x, dst_x in [(slice(0, width - dx), slice(dx, width)), (slice(width - dx, width), slice(0, dx))]:
+                    out[robots, dst_y, dst_x] = self.beliefs[robots, src_y, src_x]
+        return out
+
+    def move(self, steps: np.ndarray) -> None:
+        """Moves every robot by its own step and updates its belief.
+
+        Args:
+            steps: Array of (dy, dx) steps of shape (num_robots, 2)
+        """
+        steps = np.asarray(steps, dtype=np.int64)
+        self.true_poses = (self.true_poses + steps) % [self.height, self.width]
+        # Shift the front buffer into the center of the padded grids,
+        # blur them into the back buffer and swap the buffers.
+        cy: int = self._window.shape[0] // 2
+        cx: int = self._window.shape[1] // 2
+        self.shift_into(steps, self._center)
+        wrap_pad(self._padded, cy, cx)
+        if self._vectors is None:
+            convolve_padded(self._padded, self._window, self._back, self._scratch)
+        else:
+            column, row = self._vectors
+            convolve_padded(self._padded, column[:, None], self._vertical, self._vertical_scratch)
+            convolve_padded(self._vertical, row[None, :], self._back, self._scratch)
+        self._back /= self._back.sum(axis=(1, 2), keepdims=True)
+        self.beliefs, self._back = self._back, self.beliefs
+
+    def random_moves(self) -> np.ndarray:
+        """Randomly determines a step in {-1, 0, 1} for both
+        directions and every robot.
+
+        Returns:
+            Array of steps of shape (num_robots, 2)
+        """
+        return self.rng.integers(-1, 2, (self.num_robots, 2))
+
+    def statistics(self) -> Dict[str, float]:
+        """Summarizes how well the robots are localized. A robot has
+        a strong opinion when its best belief is more than twice its
+        second best belief, see helpers.are_robots_localized.
+
+        Returns:
+            Dictionary of the fraction of robots with a strong opinion,
+            the fraction of robots with a strong and correct opinion,
+            the fraction of robots whose best guess is correct and the
+            mean belief at the true positions
+        """
+        strong, correct, _ = are_robots_localized(self.beliefs, self.true_poses)
+        true_beliefs: np.ndarray = self.beliefs[np.arange(self.num_robots), self.true_poses[:, 0], self.true_poses[:, 1]]
+        return {
+            'strong': float(strong.mean()),
+            'localized': float((strong & correct).mean()),
+            'correct': float(correct.mean()),
+            'true_belief': float(true_beliefs.mean()),
+        }
+
+    def run(self, num_steps: int = 1) -> List[Dict[str, float]]:
+        """Executes num_steps steps of sensing and random moves for
+        all robots.
+
+        Args:
+            num_steps: Number of steps to take for the robots
+
+        Returns:
+            Localization statistics after every step
+        """
+        stats: List[Dict[str, float]] = []
+        for _ in range(num_steps):
+            self.sense()
+            self.move(self.random_moves())
+            stats.append(self.statistics())
+        return stats
@@ -0,0 +1,404 @@
+from __future__ import annotations
+from typing import Iterator, List, Tuple, Union
+import numpy as np
+from helpers import Grid_t, normalize, as_window, blur_array
+from world import World
+
+
+class Belief(object):
+    """Belief of the robot about its location in a 2D grid world,
+    stored as a contiguous float64 NumPy array. The sense, move and
+    blur steps update the belief in place and return it, so that the
+    steps can be chained.
+
+    A Belief can be read like the list of lists beliefs, i.e. with
+    len(belief), belief[i][j] and by iterating over its rows.
+
+    Attributes:
+        values: 2D array of probabilities of shape (height, width)
+    """
+
+    values: np.ndarray
+
+    def __init__(self, values: Grid_t) -> None:
+        """Initializes the Belief from a list of lists or an array.
+        The values are copied.
+
+        Args:
+            values: 2D grid of probabilities
+        """
+        self.values = np.array(values, dtype=np.float64, order='C')
+
+    @classmethod
+    def uniform(cls, height: int, width: int) -> Belief:
+        """Creates a uniform probability distribution over a world
+        of the given size.
+
+        Args:
+            height: Number of rows of the world
+            width: Number of columns of the world
+
+        Returns:
+            Uniform Belief
+        """
+        return cls(np.full((height, width), 1.0 / (height * width)))
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.values.shape
+
+    def normalize(self) -> Belief:
+        """Normalizes the belief in place"""
+        normalize(self.values)
+        return self
+
+    def sense(self, color: str, grid: Union[Grid_t, World], p_hit: float, p_miss: float) -> Belief:
+        """Implements the sensor measurement step. Every cell of the
+        world having the observed color is weighted by p_hit, every
+        other cell by p_miss.
+
+        Args:
+            color: Observation by the robot i.e. the sensor measurement
+            grid: The robot world as World, or as list of lists or 
+            array of colors, which are compared as strings
+            p_hit: Factor to consider if the measurement is correct
+            p_miss: Factor to consider if the measurement is incorrect
+
+        Returns:
+            The posterior belief
+        """
+        if isinstance(grid, World):
+            self.values *= grid.likelihood(color, p_hit, p_miss)
+        else:
+            self.values *= np.where(np.asarray(grid) == color, p_hit, p_miss)
+        return self.normalize()
+
+    def move(self, dy: int, dx: int, blurring: Union[float, np.ndarray]) -> Belief:
+        """Implements the move step. The belief is shifted cyclically
+        by the step and then blurred.
+
+        Args:
+            dy: Step to take in the vertical direction
+            dx: Step to take in the horizontal direction
+            blurring: Floating point factor for spreading out the probabilities,
+            or a 2D array of blurring window weights
+
+        Returns:
+            The moved belief
+        """
+        self.values = np.roll(self.values, (dy, dx), axis=(0, 1))
+        return self.blur(blurring)
+
+    def blur(self, blurring: Union[float, np.ndarray]) -> Belief:
+        """Spreads out the belief with the 3x3 blurring window or a
+        given window, wrapping around the edges of the world.
+
+        Args:
+            blurring: Floating point factor for spreading out the probabilities,
+            or a 2D array of blurring window weights
+
+        Returns:
+            The blurred belief
+        """
+        self.values = blur_array(self.values, blurring)
+        return self.normalize()
+
+    def copy(self) -> Belief:
+        return Belief(self.values)
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        return np.asarray(self.values, dtype=dtype)
+
+    def tolist(self) -> List[List[float]]:
+        return self.values.tolist()
+
+    def __len__(self) -> int:
+        return self.values.shape[0]
+
+    def __getitem__(self, index: int) -> np.ndarray:
+        return self.values[index]
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        return iter(self.values)
+
+    def __repr__(self) -> str:
+        return f'Belief({self.values!r})'
+
+
+class LogBelief(Belief):
+    """Belief kept as log-probabilities. The sense step adds the 
+    log-likelihoods of the observation without normalizing, so that 
+    long runs of measurements can't underflow. The log-sum-exp 
+    normalization is deferred until the probabilities are read, or 
+    until the log-probabilities drift too far away from zero.
+
+    A LogBelief can be used wherever a Belief is, reading values 
+    gives the normalized probabilities.
+
+    Attributes:
+        log_values: 2D array of unnormalized log-probabilities
+        max_drift: Largest upper bound of the log-probabilities before 
+        they are shifted back to zero
+    """
+
+    log_values: np.ndarray
+    max_drift: float
+
+    def __init__(self, values: Grid_t, max_drift: float = 100.0) -> None:
+        """Initializes the LogBelief from probabilities.
+
+        Args:
+            values: 2D grid of probabilities
+            max_drift: Largest upper bound of the log-probabilities 
+            before they are shifted back to zero
+        """
+        self.max_drift = max_drift
+        self.values = values
+
+    @classmethod
+    def from_log(cls, log_values: np.ndarray, max_drift: float = 100.0) -> LogBelief:
+        belief: LogBelief = cls.__new__(cls)
+        belief.max_drift = max_drift
+        belief._set_log(np.array(log_values, dtype=np.float64, order='C'), normalized=False)
+        return belief
+
+    def _set_log(self, log_values: np.ndarray, normalized: bool) -> None:
+        self.log_values = log_values
+        # Upper bound of the log-probabilities, 0.0 once normalized
+        self._bound: float = 0.0 if normalized else float(log_values.max())
+        self._normalized: bool = normalized
+        self._values: np.ndarray = None
+
+    @property
+    def values(self) -> np.ndarray:
+        """Normalized probabilities, computed when first read after 
+        an update"""
+        if self._values is None:
+            self.normalize()
+            self._values = np.exp(self.log_values)
+        return self._values
+
+    @values.setter
+    def values(self, values: Grid_t) -> None:
+        with np.errstate(divide='ignore'):
+            self._set_log(np.log(np.array(values, dtype=np.float64, order='C')), normalized=False)
+
+    def normalize(self) -> LogBelief:
+        """Normalizes the log-probabilities in place with log-sum-exp"""
+        if not self._normalized:
+            shift: float = self._bound + np.log(np.exp(self.log_values - self._bound).sum())
+            self.log_values -= shift
+            self._bound = 0.0
+            self._normalized = True
+        return self
+
+    def sense(self, color: str, grid: Union[Grid_t, World], p_hit: float, p_miss: float) -> LogBelief:
+        """Implements the sensor measurement step by adding the 
+        log-likelihoods of the observation. 
+
+        Args:
+            color: Observation by the robot i.e. the sensor measurement
+            grid: The robot world as World, or as list of lists or 
+            array of colors, which are compared as strings
+            p_hit: Factor to consider if the measurement is correct
+            p_miss: Factor to consider if the measurement is incorrect
+
+        Returns:
+            The posterior belief, not normalized yet
+        """
+        if isinstance(grid, World):
+            self.log_values += grid.likelihood(color, p_hit, p_miss, log=True)
+        else:
+            self.log_values += np.where(np.asarray(grid) == color, np.log(p_hit), np.log(p_miss))
+        self._bound += max(np.log(p_hit), np.log(p_miss))
+        self._normalized = False
+        self._values = None
+        if abs(self._bound) > self.max_drift:
+            # Shift the largest log-probability back to zero
+            top: float = float(self.log_values.max())
+            self.log_values -= top
+            self._bound = 0.0
+        return self
+
+    def move(self, dy: int, dx: int, blurring: Union[float, np.ndarray]) -> LogBelief:
+        """Implements the move step. The blurring has to add up 
+        probabilities, so it runs on the probabilities relative to 
+        the upper bound, and the result is normalized on the way 
+        back to log-probabilities.
+
+        Args:
+            dy: Step to take in the vertical direction
+            dx: Step to take in the horizontal direction
+            blurring: Floating point factor for spreading out the probabilities,
+            or a 2D array of blurring window weights
+
+        Returns:
+            The moved belief
+        """
+        relative: np.ndarray = np.roll(self.log_values, (dy, dx), axis=(0, 1))
+        relative -= self._bound
+        np.exp(relative, out=relative)
+        blurred: np.ndarray = blur_array(relative, blurring)
+        blurred /= blurred.sum()
+        with np.errstate(divide='ignore'):
+            self._set_log(np.log(blurred, out=blurred), normalized=True)
+        return self
+
+    def blur(self, blurring: Union[float, np.ndarray]) -> LogBelief:
+        return self.move(0, 0, blurring)
+
+    def copy(self) -> LogBelief:
+        belief: LogBelief = LogBelief.from_log(self.log_values, self.max_drift)
+        belief._bound, belief._normalized = self._bound, self._normalized
+        return belief
+
+    def __repr__(self) -> str:
+        return f'LogBelief({self.log_values!r})'
+
+
+class SparseBelief(object):
+    """Belief of a well localized robot, which only keeps the cells 
+    with a probability of at least floor. Cells below the floor are 
+    dropped after every step and the rest is renormalized, so the 
+    cost of a step scales with the size of the support instead of 
+    the size of the world.
+
+    Attributes:
+        shape: Height and width of the world
+        cells: Sorted flat indices of the cells of the support
+        values: Probabilities of the cells of the support
+        floor: Smallest probability kept in the support
+    """
+
+    shape: Tuple[int, int]
+    cells: np.ndarray
+    values: np.ndarray
+    floor: float
+
+    def __init__(self, shape: Tuple[int, int], cells: np.ndarray, values: np.ndarray, floor: float) -> None:
+        self.shape = tuple(shape)
+        self.cells = np.asarray(cells, dtype=np.int64)
+        self.values = np.asarray(values, dtype=np.float64)
+        self.floor = floor
+
+    @classmethod
+    def from_dense(cls, values: Grid_t, floor: float) -> SparseBelief:
+        """Creates a SparseBelief from the cells of a dense belief 
+        with a probability of at least floor.
+
+        Args:
+            values: 2D grid of probabilities
+            floor: Smallest probability kept in the support
+
+        Returns:
+            Normalized SparseBelief
+        """
+        values = np.asarray(values, dtype=np.float64)
+        cells: np.ndarray = np.flatnonzero(values >= floor)
+        return cls(values.shape, cells, values.ravel()[cells], floor).normalize()
+
+    @property
+    def support(self) -> int:
+        return len(self.cells)
+
+    def normalize(self) -> SparseBelief:
+        """Normalizes the belief in place"""
+        self.values /= self.values.sum()
+        return self
+
+    def prune(self) -> SparseBelief:
+        """Drops the cells below the floor and renormalizes the rest.
+        The most likely cell is always kept."""
+        keep: np.ndarray = self.values >= self.floor
+        if not keep.any():
+            keep[self.values.argmax()] = True
+        self.cells = self.cells[keep]
+        self.values = self.values[keep]
+        return self.normalize()
+
+    def sense(self, color: str, grid: Union[Grid_t, World], p_hit: float, p_miss: float) -> SparseBelief:
+        """Implements the sensor measurement step on the support.
+
+        Args:
+            color: Observation by the robot i.e. the sensor measurement
+            grid: The robot world as World, or as array of colors, a 
+            list of lists is converted on every call
+            p_hit: Factor to consider if the measurement is correct
+            p_miss: Factor to consider if the measurement is incorrect
+
+        Returns:
+            The posterior belief
+        """
+        if isinstance(grid, World):
+            self.values *= grid.lookup(color, p_hit, p_miss)[grid.labels.ravel()[self.cells]]
+        else:
+            self.values *= np.where(np.asarray(grid).ravel()[self.cells] == color, p_hit, p_miss)
+        return self.normalize().prune()
+
+    def move(self, dy: int, dx: int, blurring: Union[float, np.ndarray]) -> SparseBelief:
+        """Implements the move step on the support. Every cell of the 
+        support spreads its probability to the cells of the blurring 
+        window around its shifted position, and the probabilities 
+        landing on the same cell are added up.
+
+        Args:
+            dy: Step to take in the vertical direction
+            dx: Step to take in the horizontal direction
+            blurring: Floating point factor for spreading out the probabilities,
+            or a 2D array of blurring window weights
+
+        Returns:
+            The moved belief
+        """
+        window: np.ndarray = as_window(blurring)
+        height, width = self.shape
+        cy: int = window.shape[0] // 2
+        cx: int = window.shape[1] // 2
+        ys: np.ndarray = self.cells // width + dy - cy
+        xs: np.ndarray = self.cells % width + dx - cx
+        offsets_y, offsets_x = np.nonzero(window)
+        targets: np.ndarray = ((ys[None, :] + offsets_y[:, None]) % height) * width + (xs[None, :] + offsets_x[:, None]) % width
+        weights: np.ndarray = window[offsets_y, offsets_x][:, None] * self.values[None, :]
+        self.cells, inverse = np.unique(targets.ravel(), return_inverse=True)
+        self.values = np.bincount(inverse.ravel(), weights=weights.ravel(), minlength=len(self.cells))
+        return self.normalize().prune()
+
+    def top(self, k: int = 2) -> Tuple[List[Tuple[int, int]], np.ndarray]:
+        """Finds the k most likely cells of the support.
+
+        Args:
+            k: Number of cells to find
+
+        Returns:
+            Tuple of the (y, x) positions and the probabilities of the 
+            cells, most likely first. Missing cells have probability 0.0
+        """
+        k = min(k, self.support)
+        best: np.ndarray = np.argpartition(-self.values, k - 1)[:k] if k < self.support else np.arange(k)
+        best = best[np.argsort(-self.values[best], kind='stable')]
+        positions: List[Tuple[int, int]] = [divmod(int(cell), self.shape[1]) for cell in self.cells[best]]
+        return positions, self.values[best]
+
+    def to_dense(self, out: np.ndarray = None) -> np.ndarray:
+        """Scatters the support into a dense 2D array.
+
+        Args:
+            out: Optional preallocated array of the shape of the world
+
+        Returns:
+            2D array of probabilities
+        """
+        if out is None:
+            out = np.empty(self.shape)
+        out.fill(0.0)
+        out.put(self.cells, self.values)
+        return out
+
+    def copy(self) -> SparseBelief:
+        return SparseBelief(self.shape, self.cells.copy(), self.values.copy(), self.floor)
+
+    def tolist(self) -> List[List[float]]:
+        return self.to_dense().tolist()
+
+    def __repr__(self) -> str:
+        return f'SparseBelief(shape={self.shape}, support={self.support}, floor={self.floor})'
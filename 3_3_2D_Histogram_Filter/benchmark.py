@@ -0,0 +1,215 @@
+import time
+import tracemalloc
+import argparse
+from typing import Callable, Dict, List
+import random
+import numpy as np
+from simulate import Simulation
+from batch_simulate import BatchSimulation
+from belief import Belief, LogBelief
+from world import World
+from helpers import blur_window, gaussian_window, separate_window, blur_array, choose_blur_method
+
+
+def time_call(fn: Callable[[], object], min_time: float = 0.05) -> float:
+    """Times a call, repeating it until at least min_time has 
+    passed, and returns the mean seconds per call"""
+    fn()
+    calls: int = 0
+    start: float = time.perf_counter()
+    while True:
+        fn()
+        calls += 1
+        elapsed: float = time.perf_counter() - start
+        if elapsed >= min_time:
+            return elapsed / calls
+
+
+def benchmark_blur(sizes: List[int], windows: Dict[str, np.ndarray]) -> None:
+    """Times every blur method for every grid size and window, next 
+    to the fastest one and the one picked automatically, and reports 
+    the grid sizes where FFT convolution beats the others"""
+    for name, window in windows.items():
+        print(f'\n{name} window ({window.shape[0]}x{window.shape[1]})')
+        print(f'{"grid":>6} {"direct":>10} {"separable":>10} {"fft":>10}  {"fastest":<10} {"auto":<10}')
+        fft_sizes: List[int] = []
+        for size in sizes:
+            grid: np.ndarray = np.random.rand(size, size)
+            out: np.ndarray = np.empty_like(grid)
+            times: Dict[str, float] = {}
+            for method in ['direct', 'separable', 'fft']:
+                if method == 'separable' and separate_window(window) is None:
+                    continue
+                times[method] = time_call(lambda: blur_array(grid, window, out, method))
+            fastest: str = min(times, key=times.get)
+            if fastest == 'fft':
+                fft_sizes.append(size)
+            cells = [f'{times[m] * 1000:9.3f}m' if m in times else f'{"-":>10}' for m in ['direct', 'separable', 'fft']]
+            print(f'{size:>6} {" ".join(cells)}  {fastest:<10} {choose_blur_method(grid.shape, window):<10}')
+        if not fft_sizes:
+            print('FFT is never the fastest for these grid sizes')
+        else:
+            print(f'FFT is the fastest for grid sizes {fft_sizes}')
+
+
+def benchmark_batch(num_robots: int, size: int, num_steps: int, blur: float = 0.05, p_hit: float = 200.0) -> None:
+    """Times running many robots as Simulation objects in a loop
+    against running them all at once in a BatchSimulation"""
+    rng: np.random.Generator = np.random.default_rng(0)
+    grid: List[List[str]] = rng.choice(['r', 'g'], (size, size)).tolist()
+    random.seed(0)
+
+    start: float = time.perf_counter()
+    for _ in range(num_robots):
+        Simulation(grid, blur, p_hit).run(num_steps)
+    loop_time: float = time.perf_counter() - start
+
+    start = time.perf_counter()
+    stats = BatchSimulation(grid, blur, p_hit, num_robots, seed=0).run(num_steps)
+    batch_time: float = time.perf_counter() - start
+
+    print(f'{num_robots} robots, {size}x{size} grid, {num_steps} steps')
+    print(f'Simulation loop {loop_time:8.3f} s')
+    print(f'BatchSimulation {batch_time:8.3f} s  ({loop_time / batch_time:.0f}x faster)')
+    print(f'localized after the last step: {stats[-1]["localized"]:.1%}')
+
+
+def benchmark_memory(size: int, num_steps: int, blur: float = 0.05, p_hit: float = 200.0) -> None:
+    """Traces the memory allocated by a long Simulation.run with list 
+    of lists beliefs and with double buffered beliefs. The peak is 
+    measured above the memory held before the run, so it shows what 
+    a single step allocates at most. Double buffered steps only use 
+    the fixed size ufunc buffer NumPy takes for strided views."""
+    grid: List[List[str]] = np.random.default_rng(0).choice(['r', 'g'], (size, size)).tolist()
+    print(f'{size}x{size} grid, {num_steps} steps, one grid is {size * size * 8 / 1024:.1f} KiB')
+    for double_buffered in [False, True]:
+        random.seed(0)
+        simulation: Simulation = Simulation(grid, blur, p_hit, double_buffered=double_buffered)
+        simulation.run(10)
+        tracemalloc.start()
+        base, _ = tracemalloc.get_traced_memory()
+        start: float = time.perf_counter()
+        simulation.run(num_steps)
+        elapsed: float = time.perf_counter() - start
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        name: str = 'double buffered' if double_buffered else 'list of lists'
+        print(f'{name:<16} peak +{(peak - base) / 1024:9.1f} KiB   retained +{(current - base) / 1024:6.1f} KiB   '
+              f'{elapsed / num_steps * 1e6:8.1f} us/step')
+
+
+def benchmark_sparse(sizes: List[int], num_steps: int, floor: float = 1e-7, blur: float = 0.05, p_hit: float = 200.0) -> None:
+    """Times the steps of a localized robot with dense double buffered 
+    beliefs and with sparse beliefs for growing worlds"""
+    print(f'{"grid":>6} {"dense":>10} {"sparse":>10} {"support":>8}')
+    for size in sizes:
+        grid: List[List[str]] = np.random.default_rng(0).choice(['r', 'g', 'b', 'y'], (size, size)).tolist()
+        times: List[float] = []
+        for sparse_floor in [None, floor]:
+            random.seed(0)
+            simulation: Simulation = Simulation(grid, blur, p_hit, double_buffered=True, sparse_floor=sparse_floor)
+            simulation.run(30)
+            start: float = time.perf_counter()
+            simulation.run(num_steps)
+            times.append((time.perf_counter() - start) / num_steps)
+        support: int = getattr(simulation.beliefs, 'support', size * size)
+        print(f'{size:>6} {times[0] * 1000:9.3f}m {times[1] * 1000:9.3f}m {support:>8}')
+
+
+def benchmark_sense(size: int, color_counts: List[int], p_hit: float = 200.0) -> None:
+    """Times the sense step comparing the colors of the grid as 
+    strings against looking up the likelihoods in a World"""
+    print(f'{size}x{size} grid')
+    print(f'{"colors":>7} {"strings":>10} {"world":>10}')
+    for num_colors in color_counts:
+        colors: List[str] = [f'color{i}' for i in range(num_colors)]
+        grid: List[List[str]] = np.random.default_rng(0).choice(colors, (size, size)).tolist()
+        world: World = World(grid)
+        belief: Belief = Belief.uniform(size, size)
+        times: List[float] = [time_call(lambda: belief.sense(colors[0], grid, p_hit, 1.0)),
+                              time_call(lambda: belief.sense(colors[0], world, p_hit, 1.0))]
+        print(f'{num_colors:>7} {times[0] * 1000:9.3f}m {times[1] * 1000:9.3f}m')
+
+
+def benchmark_log(size: int, senses: int, blur: float = 0.05, p_hit: float = 200.0) -> None:
+    """Times runs of several sense steps followed by a move with 
+    probabilities and with log-probabilities, and shows where the 
+    unnormalized probabilities underflow"""
+    grid: List[List[str]] = np.random.default_rng(0).choice(['r', 'g', 'b', 'y'], (size, size)).tolist()
+    world: World = World(grid)
+    colors: List[str] = [grid[size // 2][size // 2], grid[0][0]]
+
+    def steps(belief: Belief) -> None:
+        for i in range(senses):
+            belief.sense(colors[i % 2], world, p_hit, 1.0)
+        belief.move(1, 0, blur)
+        belief.values
+
+    print(f'{size}x{size} grid, {senses} sense steps per move')
+    belief: Belief = Belief.uniform(size, size)
+    print(f'probabilities     {time_call(lambda: steps(belief)) * 1000:8.3f} ms')
+    log_belief: LogBelief = LogBelief.uniform(size, size)
+    print(f'log-probabilities {time_call(lambda: steps(log_belief)) * 1000:8.3f} ms')
+
+    # Without normalizing after every sense step, weak observations 
+    # drive the probabilities below the smallest float.
+    raw: np.ndarray = Belief.uniform(size, size).values
+    log_belief = LogBelief.uniform(size, size)
+    for i in range(1000):
+        raw *= world.likelihood(colors[1], 0.1, 0.01)
+        log_belief.sense(colors[1], world, 0.1, 0.01)
+    print(f'after 1000 sense steps the probabilities sum up to {raw.sum():.6f}, '
+          f'the log-probabilities to {log_belief.values.sum():.6f}')
+
+
+def benchmark_render(size: int, num_frames: int) -> None:
+    """Times drawing frames with show_beliefs, which builds a new 
+    scatter plot figure every time, against the headless renderer. 
+    Runs without a display, the figures of show_beliefs are closed 
+    so that they don't pile up."""
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib import pyplot as plt
+    grid: List[List[str]] = np.random.default_rng(0).choice(['r', 'g'], (size, size)).tolist()
+    simulation: Simulation = Simulation(grid, 0.05, 200.0, double_buffered=True)
+
+    def show() -> None:
+        simulation.show_beliefs(past_turn=True)
+        plt.gcf().canvas.draw()
+        plt.close('all')
+
+    print(f'{size}x{size} grid')
+    print(f'show_beliefs {time_call(show, min_time=num_frames * 0.01) * 1000:8.1f} ms/frame')
+    print(f'render       {time_call(simulation.render, min_time=num_frames * 0.01) * 1000:8.1f} ms/frame')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('benchmark', choices=['blur', 'batch', 'memory', 'sparse', 'sense', 'log', 'render'])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[16, 32, 64, 128, 256, 512, 1024])
+    parser.add_argument('--robots', type=int, default=1000)
+    parser.add_argument('--size', type=int, default=25)
+    parser.add_argument('--steps', type=int, default=20)
+    parser.add_argument('--senses', type=int, default=8)
+    args = parser.parse_args()
+
+    if args.benchmark == 'blur':
+        benchmark_blur(args.sizes, {
+            'blur 0.1': blur_window(0.1),
+            'gaussian 1.0': gaussian_window(1.0),
+            'gaussian 2.0': gaussian_window(2.0),
+            'uniform 7': np.full((7, 7), 1.0 / 49),
+            'gaussian 5.0': gaussian_window(5.0),
+        })
+    elif args.benchmark == 'batch':
+        benchmark_batch(args.robots, args.size, args.steps)
+    elif args.benchmark == 'memory':
+        benchmark_memory(args.size, args.steps)
+    elif args.benchmark == 'sparse':
+        benchmark_sparse(args.sizes, args.steps)
+    elif args.benchmark == 'sense':
+        benchmark_sense(args.size, [2, 16, 256, 4096])
+    elif args.benchmark == 'log':
+        benchmark_log(args.size, args.senses)
+    elif args.benchmark == 'render':
+        benchmark_render(args.size, args.steps)
@@ -1,54 +1,47 @@
-from typing import List, Tuple
+from typing import List, Tuple, Union
+import numpy as np
 
 
-def normalize(grid: List[List[float]]) -> List[List[float]]:
+# Grids are accepted as list of lists or as 2D NumPy arrays
+Grid_t = Union[List[List[float]], np.ndarray]
+
+
+def normalize(grid: Grid_t) -> Grid_t:
     """Given a grid of nonnormalized probabilities, computes the
-    correspond normalized version of that grid. 
+    correspond normalized version of that grid. The grid is 
+    normalized in place.
     
     Args:
         grid: 2D grid of nonnormalized probability distribution
     
     Returns:
-        2D grid of normalized probability distribution
+        2D grid of normalized probability distribution, of the 
+        same type as the input grid
     """
-    #TODO: Refactor to use NumPy
-    # Get the sum total of all probabilities in the 
-    # grid.
-    total: float = 0.0
-    for row in grid:
-        for cell in row:
-            total += cell
-    # Enumerate over each single element of the grid 
-    # using nested loops and normalize the value by 
-    # dividing the same with the sum.
-    for i,row in enumerate(grid):
-        for j,cell in enumerate(row):
-            grid[i][j] = float(cell) / total
+    if isinstance(grid, np.ndarray):
+        # Divide every cell by the sum total of all probabilities 
+        # in a single pass over the array.
+        grid /= grid.sum()
+        return grid
+    # Normalize a copy as an array and write the rows back into 
+    # the list of lists, so that callers holding the grid see 
+    # the normalized values.
+    normalized: np.ndarray = normalize(np.array(grid, dtype=np.float64))
+    for i, row in enumerate(normalized.tolist()):
+        grid[i][:] = row
     return grid
 
 
-def blur(grid: List[List[float]], blurring: float) -> List[List[float]]:
-    """Spreads probability out on a grid using a 3x3 blurring window.
-    The blurring parameter controls how much of a belief spills out
-    into adjacent cells. If blurring is 0 this function will have 
-    no effect. In essence, it defines a smoothening kernel with 
-    the help of blurring factor and makes a convolution with 
-    the input grid.
+def blur_window(blurring: float) -> np.ndarray:
+    """Creates the 3x3 blurring window for a given blurring factor.
 
     Args:
-        grid: 2D grid of probabilities
         blurring: Float value as a factor of spreading out the 
         probabilities
-    
+
     Returns:
-        2D grid of spread out probabilities
+        3x3 array of the window weights, summing up to 1.0
     """
-    #TODO: Refactor to use NumPy
-    # Since the grid is a list of lists number of inner lists 
-    # is the height and number of elements in any of the inner 
-    # lists is width.
-    height: int = len(grid)
-    width: int  = len(grid[0])
     # Assuming that the center has the maximum probability 
     # before spreading out, subtract the blurring from 1.0 
     # to get the new center probability after blurring.
@@ -62,35 +55,304 @@ def blur(grid: List[List[float]], blurring: float) -> List[List[float]]:
     adjacent_prob: float = blurring / 6.0
     # This is very similar to defining a normalization kernel 
     # or in other words a smoothening filter.
-    window: List[List[float]] = [
+    return np.array([
         [corner_prob,  adjacent_prob,  corner_prob],
         [adjacent_prob, center_prob,  adjacent_prob],
         [corner_prob,  adjacent_prob,  corner_prob]
-    ]
-    # Initialize a new 2D grid of 0.0 values with the predetermined 
-    # height and width of the input grid.
-    new: List[List[float]] = [[0.0 for i in range(width)] for j in range(height)]
-    # Following nested loop constrcut in essence implements a 2D 
-    # convolution of the input grid with the window defined above.
-    # Iterate over the input grid
-    for i in range(height):
-        for j in range(width):
-            # Get each single grid value
-            grid_val: float = grid[i][j]
-            # Iterate in range [-1, 0, 1] for outer index
-            for dx in range(-1,2):
-                # Iterate in range [-1, 0, 1] for inner index
-                for dy in range(-1,2):
-                    # Get a value from the defined window. 
-                    # The [dx+1][dy+1] indexing results in 
-                    # (0,0),(0,1),(0,2)
-                    # (1,0),(1,1),(1,2)
-                    # (2,0),(2,1),(2,2) indexing
-                    mult: float = window[dx+1][dy+1]
-                    new_i: int = (i + dy) % height
-                    new_j: int = (j + dx) % width
-                    new[new_i][new_j] += mult * grid_val
-    return normalize(new)
+    ])
+
+
+def as_window(blurring: Union[float, np.ndarray]) -> np.ndarray:
+    """Turns a blurring factor into the 3x3 blurring window, or checks
+    a given window, which needs an odd height and width so that it
+    has a center cell.
+
+    Args:
+        blurring: Float value as a factor of spreading out the
+        probabilities, or a 2D array of window weights
+
+    Returns:
+        2D array of the window weights
+    """
+    if not isinstance(blurring, np.ndarray):
+        return blur_window(blurring)
+    if blurring.ndim != 2 or blurring.shape[0] % 2 == 0 or blurring.shape[1] % 2 == 0:
+        raise ValueError(f'Expected a 2D window of odd height and width, got shape {blurring.shape}')
+    return blurring
+
+
+def gaussian_window(sigma: float, size: int = None) -> np.ndarray:
+    """Creates a normalized 2D Gaussian blurring window, e.g. for 
+    the motion noise of coarser time steps.
+
+    Args:
+        sigma: Standard deviation of the Gaussian in cells
+        size: Odd width and height of the window, by default 
+        large enough to cover three standard deviations
+
+    Returns:
+        2D array of the window weights, summing up to 1.0
+    """
+    if size is None:
+        size = 2 * int(np.ceil(3.0 * sigma)) + 1
+    if size % 2 == 0:
+        raise ValueError(f'The size of the window has to be odd, got {size}')
+    offsets: np.ndarray = np.arange(size) - size // 2
+    profile: np.ndarray = np.exp(-0.5 * (offsets / sigma) ** 2)
+    window: np.ndarray = np.outer(profile, profile)
+    return window / window.sum()
+
+
+def separate_window(window: np.ndarray, rtol: float = 1e-9) -> Tuple[np.ndarray, np.ndarray]:
+    """Splits a window into a column and a row vector whose outer 
+    product is the window, if the window has rank one.
+
+    Args:
+        window: 2D array of window weights
+        rtol: Tolerance of the second singular value, relative 
+        to the first one
+
+    Returns:
+        Tuple of column and row vectors, or None if the window 
+        is not separable
+    """
+    u, sv, vt = np.linalg.svd(window)
+    if len(sv) > 1 and sv[1] > rtol * sv[0]:
+        return None
+    scale: float = np.sqrt(sv[0])
+    return u[:, 0] * scale, vt[0] * scale
+
+
+# Cost model of the blur methods in seconds, fitted to the timings 
+# of benchmark.py. A direct or separable pass is one shifted 
+# multiply-add over the grid, the FFT pays for its transforms.
+PASS_OVERHEAD: float = 5e-6
+PASS_CELL_COST: float = 2.5e-9
+FFT_OVERHEAD: float = 1.3e-4
+FFT_CELL_COST: float = 3e-9
+
+
+def choose_blur_method(shape: Tuple[int, ...], window: np.ndarray) -> str:
+    """Picks the cheapest way to convolve a grid, or a stack of 
+    grids, of the given shape with the window, according to the 
+    cost model above.
+
+    Args:
+        shape: Shape of the grid, the last two axes being height 
+        and width
+        window: 2D array of window weights
+
+    Returns:
+        One of 'direct', 'separable' or 'fft'
+    """
+    cells: int = int(np.prod(shape))
+    grid_cells: int = shape[-2] * shape[-1]
+    pass_cost: float = PASS_OVERHEAD + PASS_CELL_COST * cells
+    costs = {'direct': np.count_nonzero(window) * pass_cost}
+    if min(window.shape) > 1 and separate_window(window) is not None:
+        costs['separable'] = (window.shape[0] + window.shape[1]) * pass_cost
+    costs['fft'] = FFT_OVERHEAD + FFT_CELL_COST * cells * np.log2(max(grid_cells, 2))
+    return min(costs, key=costs.get)
+
+
+def roll_into(grid: np.ndarray, dy: int, dx: int, out: np.ndarray) -> np.ndarray:
+    """Shifts the last two axes of a grid cyclically by (dy, dx) 
+    like np.roll, but writes the result into a preallocated array.
+
+    Args:
+        grid: Array to shift
+        dy: Step in the vertical direction
+        dx: Step in the horizontal direction
+        out: Array of the same shape for the result, must not be 
+        the input grid
+
+    Returns:
+        The shifted grid
+    """
+    height, width = grid.shape[-2:]
+    dy %= height
+    dx %= width
+    # The grid falls apart into at most four blocks, each of which 
+    # is copied to its new place as a whole.
+    for src_y, dst_y in [(slice(0, height - dy), slice(dy, height)), (slice(height - dy, height), slice(0, dy))]:
+        for src_x, dst_x in [(slice(0, width - dx), slice(dx, width)), (slice(width - dx, width), slice(0, dx))]:
+            out[..., dst_y, dst_x] = grid[..., src_y, src_x]
+    return out
+
+
+def wrap_pad(padded: np.ndarray, cy: int, cx: int) -> np.ndarray:
+    """Fills the border of a padded grid by wrapping the grid around, 
+    like np.pad with mode='wrap'. The grid must already be in the 
+    center of the padded array and the border can't be larger than 
+    the grid.
+
+    Args:
+        padded: Array with cy rows and cx columns of border on 
+        each side
+        cy: Vertical size of the border
+        cx: Horizontal size of the border
+
+    Returns:
+        The padded grid
+    """
+    height: int = padded.shape[-2] - 2 * cy
+    width: int = padded.shape[-1] - 2 * cx
+    if cy > height or cx > width:
+        raise ValueError(f'The border of {cy}x{cx} cells is larger than the {height}x{width} grid')
+    if cy:
+        padded[..., :cy, cx:cx+width] = padded[..., height:height+cy, cx:cx+width]
+        padded[..., cy+height:, cx:cx+width] = padded[..., cy:2*cy, cx:cx+width]
+    if cx:
+        padded[..., :, :cx] = padded[..., :, width:width+cx]
+        padded[..., :, cx+width:] = padded[..., :, cx:2*cx]
+    return padded
+
+
+def convolve_padded(padded: np.ndarray, window: np.ndarray, out: np.ndarray, shifted: np.ndarray) -> np.ndarray:
+    # Every cell (i, j) spreads its probability to (i + dy, j + dx), 
+    # which for the whole grid at once is a cyclic shift of the 
+    # grid by (dy, dx) weighted by the window. On the wrap padded 
+    # grid every shift is a view. The shifts of equal weight are 
+    # summed up before they are weighted, which for the symmetric 
+    # blurring windows saves almost half of the passes over the 
+    # grid. Only the last two axes are convolved, so stacks of 
+    # grids work too. Nothing is allocated, shifted is a scratch 
+    # array of the shape of out.
+    height, width = out.shape[-2:]
+    cy: int = window.shape[0] // 2
+    cx: int = window.shape[1] // 2
+    first: bool = True
+    for weight in np.unique(window[window != 0.0]):
+        views: List[np.ndarray] = [padded[..., 2*cy-a:2*cy-a+height, 2*cx-b:2*cx-b+width] 
+                                   for a, b in zip(*np.nonzero(window == weight))]
+        if len(views) == 1:
+            target: np.ndarray = out if first else shifted
+            np.multiply(views[0], weight, out=target)
+        else:
+            np.add(views[0], views[1], out=shifted)
+            for view in views[2:]:
+                shifted += view
+            target = out if first else shifted
+            np.multiply(shifted, weight, out=target)
+        if not first:
+            out += shifted
+        first = False
+    if first:
+        out.fill(0.0)
+    return out
+
+
+def convolve_direct(grid: np.ndarray, window: np.ndarray, out: np.ndarray) -> np.ndarray:
+    cy: int = window.shape[0] // 2
+    cx: int = window.shape[1] // 2
+    padded: np.ndarray = np.pad(grid, ((0, 0),) * (grid.ndim - 2) + ((cy, cy), (cx, cx)), mode='wrap')
+    return convolve_padded(padded, window, out, np.empty_like(out))
+
+
+def convolve_separable(grid: np.ndarray, window: np.ndarray, out: np.ndarray) -> np.ndarray:
+    # Spread the probabilities vertically with the column vector 
+    # and then horizontally with the row vector of the window.
+    vectors: Tuple[np.ndarray, np.ndarray] = separate_window(window)
+    if vectors is None:
+        raise ValueError(f'The {window.shape[0]}x{window.shape[1]} window is not separable, use the direct or fft method')
+    column, row = vectors
+    vertical: np.ndarray = convolve_direct(grid, column[:, None], np.empty_like(out))
+    return convolve_direct(vertical, row[None, :], out)
+
+
+def convolve_fft(grid: np.ndarray, window: np.ndarray, out: np.ndarray) -> np.ndarray:
+    # Wrap the window around a zero grid of the same size with its 
+    # center at (0, 0). The product of the spectra is then the 
+    # circular convolution of the grid with the window.
+    height, width = grid.shape[-2:]
+    cy: int = window.shape[0] // 2
+    cx: int = window.shape[1] // 2
+    rows, cols = np.indices(window.shape)
+    kernel: np.ndarray = np.zeros((height, width))
+    np.add.at(kernel, ((rows - cy) % height, (cols - cx) % width), window)
+    out[...] = np.fft.irfft2(np.fft.rfft2(grid) * np.fft.rfft2(kernel), s=(height, width))
+    # Round-off must not leave negative probabilities behind
+    return np.maximum(out, 0.0, out=out)
+
+
+BLUR_METHODS = {
+    'direct': convolve_direct,
+    'separable': convolve_separable,
+    'fft': convolve_fft,
+}
+
+
+def blur_array(grid: np.ndarray, blurring: Union[float, np.ndarray], out: np.ndarray = None, method: str = 'auto') -> np.ndarray:
+    """Spreads probability out on a 2D array with a blurring window, 
+    wrapping around the edges of the world. The result is not 
+    normalized.
+
+    Args:
+        grid: 2D array of probabilities, or a stack of them with 
+        the height and width as the last two axes
+        blurring: Float value as a factor of spreading out the 
+        probabilities with the 3x3 window, or a 2D array of window 
+        weights of any odd size
+        out: Optional preallocated array of the same shape for 
+        the result, must not be the input grid
+        method: 'direct', 'separable', 'fft', or 'auto' to pick the 
+        cheapest one for the grid and window size
+
+    Returns:
+        2D array of spread out probabilities
+    """
+    window: np.ndarray = as_window(blurring)
+    if out is None:
+        out = np.empty_like(grid, dtype=np.float64)
+    if method == 'auto':
+        method = choose_blur_method(grid.shape, window)
+    return BLUR_METHODS[method](grid, window, out)
+
+
+def blur(grid: Grid_t, blurring: Union[float, np.ndarray]) -> Grid_t:
+    """Spreads probability out on a grid using a 3x3 blurring window.
+    The blurring parameter controls how much of a belief spills out
+    into adjacent cells. If blurring is 0 this function will have 
+    no effect. In essence, it defines a smoothening kernel with 
+    the help of blurring factor and makes a convolution with 
+    the input grid.
+
+    Args:
+        grid: 2D grid of probabilities
+        blurring: Float value as a factor of spreading out the 
+        probabilities, or a 2D array of window weights
+    
+    Returns:
+        2D grid of spread out probabilities, of the same type as 
+        the input grid
+    """
+    new: np.ndarray = normalize(blur_array(np.asarray(grid, dtype=np.float64), blurring))
+    if isinstance(grid, np.ndarray):
+        return new
+    return new.tolist()
+
+def top_two(beliefs: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Finds the best and the second best belief of a grid, or of 
+    every grid of a stack, in one pass with np.argpartition.
+
+    Args:
+        beliefs: 2D array of probabilities, or a stack of them with 
+        the height and width as the last two axes
+
+    Returns:
+        Tuple of the flat index of the first best cell, the best 
+        belief and the second best belief, one per grid. Like in 
+        is_robot_localized beliefs below 0.0 count as 0.0
+    """
+    flat: np.ndarray = beliefs.reshape(beliefs.shape[:-2] + (-1,))
+    best_cells: np.ndarray = flat.argmax(axis=-1)
+    if flat.shape[-1] > 1:
+        top: np.ndarray = np.take_along_axis(flat, np.argpartition(flat, -2, axis=-1)[..., -2:], axis=-1)
+        second, best = top[..., 0], top[..., 1]
+    else:
+        best, second = flat[..., 0], np.zeros(flat.shape[:-1])
+    return best_cells, np.maximum(best, 0.0), np.maximum(second, 0.0)
+
 
 def is_robot_localized(beliefs: List[List[float]], true_pos: Tuple[int, int]) -> Tuple[bool, Tuple[int, int]]:
     """Returns None if the robot has no "strong opinion" about
@@ -110,40 +372,53 @@ def is_robot_localized(beliefs: List[List[float]], true_pos: Tuple[int, int]) ->
         A tuple indication, whether the robot is localized and its 
         best known location
     """
-    best_belief: float = 0.0
-    best_pos: Tuple[int, int] = None
-    second_best: float = 0.0
-    for y, row in enumerate(beliefs):
-        for x, belief in enumerate(row):
-            # If belief probability is higher than the best_belief
-            # then best_belief goes to second best and belief 
-            # probability takes the mantle of best belief. As a 
-            # result corresponding indices becomes the best 
-            # position for the robot.
-            if belief > best_belief:
-                second_best = best_belief
-                best_belief = belief
-                best_pos = (y,x)
-            # If belief probability is greater than second_best
-            # instead then it becomes the second_best.
-            elif belief > second_best:
-                second_best = belief
+    if hasattr(beliefs, 'top'):
+        # A sparse belief finds its best cells in its support only. 
+        # Every cell outside the support is below its floor.
+        positions, values = beliefs.top(2)
+        best_pos: Tuple[int, int] = positions[0]
+        best_belief: float = values[0]
+        second_best: float = values[1] if len(values) > 1 else 0.0
+    else:
+        grid: np.ndarray = np.asarray(beliefs, dtype=np.float64)
+        best_cell, best_belief, second_best = top_two(grid)
+        # Without any positive belief there is no best position
+        best_pos = divmod(int(best_cell), grid.shape[1]) if best_belief > 0.0 else None
     # If the best belief is significantly greater than second best 
     # belief like a factor of 2.0 then we conclude, that the robot 
     # has high degree of certainty about its location.
     if second_best <= 0.00001 or best_belief / second_best > 2.0:
         # robot thinks it knows where it is
-        localized =  best_pos == true_pos
+        localized =  best_pos == tuple(true_pos)
         return localized, best_pos
     else:
         # No strong single best belief
         return None, best_pos
 
-def close_enough(g1: List[List[float]], g2: List[List[float]]) -> bool:
+def are_robots_localized(beliefs: np.ndarray, true_poses: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Batched form of is_robot_localized for a stack of beliefs.
+
+    Args:
+        beliefs: Beliefs of all robots, of shape (num_robots, height, width)
+        true_poses: True (y, x) positions of all robots, of shape (num_robots, 2)
+
+    Returns:
+        Tuple of boolean arrays, whether every robot has a strong 
+        opinion and whether its best guess is correct, and the 
+        (num_robots, 2) array of the best positions
+    """
+    width: int = beliefs.shape[-1]
+    best_cells, best, second = top_two(beliefs)
+    strong: np.ndarray = (second <= 0.00001) | (best > 2.0 * second)
+    correct: np.ndarray = best_cells == true_poses[:, 0] * width + true_poses[:, 1]
+    return strong, correct, np.stack(np.divmod(best_cells, width), axis=-1)
+
+def close_enough(g1: List[List[float]], g2: List[List[float]], tolerance: float = 0.001) -> bool:
     """Evaluates if two passed in grids of values are close enough
     Args:
         g1: First grid of float values
         g2: Second grid of float values
+        tolerance: Largest allowed absolute difference of two values
     
     Returns:
         Boolean indicator, if the values are close enough
@@ -152,9 +427,8 @@ def close_enough(g1: List[List[float]], g2: List[List[float]]) -> bool:
         return False
     if len(g1) == 0 or len(g1[0]) != len(g2[0]):
         return False
-    for r1, r2 in zip(g1,g2):
-        for v1, v2 in zip(r1, r2):
-            if abs(v1 - v2) > 0.001:
-                print(v1, v2)
-                return False
-    return True
+    a1: np.ndarray = np.asarray(g1, dtype=np.float64)
+    a2: np.ndarray = np.asarray(g2, dtype=np.float64)
+    if a1.shape != a2.shape:
+        return False
+    return not (np.abs(a1 - a2) > tolerance).any()
@@ -1,6 +1,7 @@
-import pdb
-from typing import List
-from helpers import normalize, blur
+from typing import List, Union
+import numpy as np
+from belief import Belief
+from world import World
 
 
 def initialize_beliefs(grid: List[List[float]]) -> List[List[float]]:
@@ -14,32 +15,22 @@ def initialize_beliefs(grid: List[List[float]]) -> List[List[float]]:
         Uniform probability distribution of the 
         same shape of 2D robot world
     """
-    # TODO: Refactor with NumPy
-    # Derive the height width and area from the list of lists
+    # Derive the height width from the list of lists and create 
+    # the uniform probability distribution having the same shape 
+    # as with robot world.
     height: int = len(grid)
     width: int = len(grid[0])
-    area: int = height * width
-    # Derive the uniform probability by dividing the total 
-    # probability 1.0 by area.
-    belief_per_cell: float = 1.0 / area
-    beliefs: List[List[float]] = []
-    # Create the uniform probability distribution having the 
-    # same shape as with robot world.
-    for _ in range(height):
-        row: List[float] = []
-        for _ in range(width):
-            row.append(belief_per_cell)
-        beliefs.append(row)
-    return beliefs
+    return Belief.uniform(height, width).tolist()
 
-def sense(color: str, grid: List[List[float]], beliefs: List[List[float]], p_hit: float, p_miss: float) -> List[List[float]]:
+def sense(color: str, grid: Union[List[List[float]], World], beliefs: Union[List[List[float]], Belief], p_hit: float, p_miss: float) -> Union[List[List[float]], Belief]:
     """Implements the sensor measurement step. It takes into account the world, current belief of the robot 
     as well as its sensor measurement (color) and updates prior probability distribution (beliefs) to the 
     posterior probability distribution (new_beliefs).
 
     Args:
         color: Observation by the robot i.e. the sensor measurement
-        grid: The robot world as list of lists
+        grid: The robot world as list of lists, or as World to look 
+        up the likelihoods by the labels of the cells
         beliefs: The prior probability distribution about the location of the robot
         p_hit: Factor to consider if the measurement is correct
         p_miss: Factor to consider if the measurement is incorrect
@@ -48,20 +39,13 @@ def sense(color: str, grid: List[List[float]], beliefs: List[List[float]], p_hit
         New beliefs after taking the sensor measurement into account i.e. the posterior
         probability distribution as list of lists
     """
-    new_beliefs: List[List[float]] = []
-    height: int = len(grid)
-    width: int = len(grid[0])
-    for i in range(height):
-        row: List[float] = []
-        for j in range(width):
-            hit: int = (grid[i][j] == color)
-            prior: float = beliefs[i][j]
-            posterior: float = (prior * (hit * p_hit + (1 - hit) * p_miss))
-            row.append(posterior)
-        new_beliefs.append(row)
-    return normalize(new_beliefs)
+    # A Belief is updated in place, list of lists beliefs are 
+    # left untouched and the posterior is returned as list of lists.
+    if isinstance(beliefs, Belief):
+        return beliefs.sense(color, grid, p_hit, p_miss)
+    return Belief(beliefs).sense(color, grid, p_hit, p_miss).tolist()
 
-def move(dy: int, dx: int, beliefs: List[List[float]], blurring: float) -> List[List[float]]:
+def move(dy: int, dx: int, beliefs: Union[List[List[float]], Belief], blurring: Union[float, np.ndarray]) -> Union[List[List[float]], Belief]:
     """Implements the move step. This method shifts the cell values as the robot 
     takes a step to a given x and y directions.
 
@@ -69,23 +53,15 @@ def move(dy: int, dx: int, beliefs: List[List[float]], blurring: float) -> List[
         dy: Step to take in the vertical direction
         dx: Step to take in the horizontal direction
         beliefs: Current beliefs of the robot about its location
-        blurring: Floating point factor for spreading out the probabilities
+        blurring: Floating point factor for spreading out the probabilities, 
+        or a 2D array of blurring window weights
 
     Returns:
         New belief added with uncertainties as list of lists
     """
-    # Derive the height and width of the world / belief from the 
-    # outer and inner lengths of the list of list object.
-    height: int = len(beliefs)
-    width : int= len(beliefs[0])
-    # Initialize new belief with 0.0s and the same shape of the old 
-    # belief.
-    new_G: List[List[float]] = [[0.0 for _ in range(width)] for _ in range(height)]
-
-    for i, row in enumerate(beliefs):
-        for j, cell in enumerate(row):
-            new_i: int = (i + dy ) % height
-            new_j: int = (j + dx ) % width
-            # pdb.set_trace()
-            new_G[int(new_i)][int(new_j)] = cell
-    return blur(new_G, blurring)
+    # A Belief is updated in place, list of lists beliefs are 
+    # left untouched and the moved belief is returned as list 
+    # of lists.
+    if isinstance(beliefs, Belief):
+        return beliefs.move(dy, dx, blurring)
+    return Belief(beliefs).move(dy, dx, blurring).tolist()
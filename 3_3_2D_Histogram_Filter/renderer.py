@@ -0,0 +1,131 @@
+import os
+from typing import Tuple
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib import animation
+from matplotlib import image as mpimg
+
+
+class BeliefRenderer(object):
+    """Draws the belief of a robot as a heatmap without any display.
+    The figure, the image and the markers are created once, every
+    update only replaces their data, and the frame is rendered into
+    the reusable buffer of the Agg canvas. The figure is not known
+    to pyplot, so it is freed with the renderer.
+
+    Attributes:
+        height: Number of rows of the world
+        width: Number of columns of the world
+        figure: The matplotlib figure drawn into
+        canvas: Agg canvas holding the image buffer
+    """
+
+    height: int
+    width: int
+    figure: Figure
+    canvas: FigureCanvasAgg
+
+    def __init__(self, height: int, width: int, size: float = 6.0, dpi: int = 100, cmap: str = 'Blues') -> None:
+        """Initializes BeliefRenderer
+
+        Args:
+            height: Number of rows of the world
+            width: Number of columns of the world
+            size: Width of the frames in inches
+            dpi: Pixels per inch of the frames
+            cmap: Name of the colormap of the heatmap
+        """
+        self.height = height
+        self.width = width
+        self.figure = Figure(figsize=(size, size * height / width), dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.figure)
+        self._axes = self.figure.add_axes([0.0, 0.0, 1.0, 1.0])
+        self._axes.set_axis_off()
+        # Row 0 of the world is drawn at the top, like large y above
+        # small y in show_beliefs.
+        self._image = self._axes.imshow(np.zeros((height, width)), cmap=cmap, vmin=0.0, vmax=1.0,
+                                        interpolation='nearest', origin='upper')
+        self._prev_marker, = self._axes.plot([], [], '*', color='red', markersize=15, alpha=0.3)
+        self._true_marker, = self._axes.plot([], [], '*', color='red', markersize=15)
+        self._title = self._axes.text(0.01, 0.99, '', transform=self._axes.transAxes, va='top', color='black')
+
+    def update(self, beliefs: np.ndarray, true_pose: Tuple[int, int], prev_pose: Tuple[int, int] = None,
+               title: str = '') -> None:
+        """Replaces the data of the heatmap and the markers. The color
+        scale goes up to the best belief, so that small beliefs stay
+        visible.
+
+        Args:
+            beliefs: 2D grid of probabilities
+            true_pose: True position of the robot
+            prev_pose: Optional previous position of the robot
+            title: Text drawn in the top left corner
+        """
+        values: np.ndarray = np.asarray(beliefs, dtype=np.float64)
+        self._image.set_data(values)
+        self._image.set_clim(0.0, values.max() or 1.0)
+        self._true_marker.set_data([true_pose[1]], [true_pose[0]])
+        if prev_pose is None:
+            self._prev_marker.set_data([], [])
+        else:
+            self._prev_marker.set_data([prev_pose[1]], [prev_pose[0]])
+        self._title.set_text(title)
+
+    def render(self) -> np.ndarray:
+        """Draws the figure into the image buffer of the canvas.
+
+        Returns:
+            RGBA array of shape (height, width, 4) viewing the image
+            buffer, overwritten by the next render
+        """
+        self.canvas.draw()
+        return np.asarray(self.canvas.buffer_rgba())
+
+    def save(self, path: str) -> np.ndarray:
+        """Renders the current frame, writes it as PNG and returns it"""
+        frame: np.ndarray = self.render()
+        mpimg.imsave(path, frame)
+        return frame
+
+
+def record(simulation, num_steps: int, path: str, fps: int = 10, renderer: BeliefRenderer = None) -> BeliefRenderer:
+    """Runs a simulation and records a frame after every step. A path
+    ending in .gif or .mp4 is written as animation, by Pillow or by
+    ffmpeg, any other path is a pattern for the names of a sequence
+    of PNG files, formatted with the step, e.g. frames/{:05d}.png.
+
+    Args:
+        simulation: Simulation to run
+        num_steps: Number of steps to record
+        path: Path of the animation or pattern of the PNG files
+        fps: Frames per second of an animation
+        renderer: Optional renderer to reuse
+
+    Returns:
+        The renderer
+    """
+    if renderer is None:
+        renderer = BeliefRenderer(simulation.height, simulation.width)
+
+    def draw(step: int) -> None:
+        renderer.update(simulation.dense_beliefs(), simulation.true_pose, simulation.prev_pose, f'step {step}')
+
+    extension: str = os.path.splitext(path)[1].lower()
+    if extension in ['.gif', '.mp4']:
+        writer = animation.PillowWriter(fps=fps) if extension == '.gif' else animation.FFMpegWriter(fps=fps)
+        with writer.saving(renderer.figure, path, renderer.figure.dpi):
+            draw(0)
+            writer.grab_frame()
+            for step in range(1, num_steps + 1):
+                simulation.run(1)
+                draw(step)
+                writer.grab_frame()
+    else:
+        draw(0)
+        renderer.save(path.format(0))
+        for step in range(1, num_steps + 1):
+            simulation.run(1)
+            draw(step)
+            renderer.save(path.format(step))
+    return renderer
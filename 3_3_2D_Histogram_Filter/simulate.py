@@ -1,14 +1,21 @@
-from typing import List, Tuple
+from typing import List, Tuple, Union
 import localizer 
 import random
-from copy import deepcopy
+import numpy as np
 from matplotlib import pyplot as plt
+from helpers import as_window, roll_into, wrap_pad, convolve_padded
+from belief import SparseBelief, LogBelief
+from world import World
+from renderer import BeliefRenderer
 
 
 class Simulation(object):
 
-	grid: List[List[str]]
-	beliefs: List[List[float]]
+	world: World
+	beliefs: Union[List[List[float]], np.ndarray, SparseBelief, LogBelief]
+	double_buffered: bool
+	sparse_floor: float
+	max_support: int
 	height: int
 	width: int
 	blur: float
@@ -24,19 +31,40 @@ class Simulation(object):
 	P: List[float]  # Denotes certainty of the robot about its location
 
 
-	def __init__(self, grid: List[List[str]], blur: float, p_hit: float, start_pos: Tuple[int, int] = None) -> None:
+	def __init__(self, grid: Union[List[List[str]], World], blur: float, p_hit: float, start_pos: Tuple[int, int] = None, 
+				 double_buffered: bool = False, sparse_floor: float = None, max_support: int = None, 
+				 log_domain: bool = False) -> None:
 		"""Initializes Simulation
 
 		Args:
-			grid: 2D grid representing the robot world
+			grid: 2D grid representing the robot world, or the World 
+			encoding it, which is then shared instead of encoded again
 			blur: 
 			p_hit:
 			start_pos: Tuple
+			double_buffered: If the beliefs should be kept in two 
+			preallocated arrays, which the steps alternate between, 
+			instead of list of lists
+			sparse_floor: If given, the beliefs switch to a SparseBelief 
+			keeping the cells with at least this probability, as soon 
+			as there are few enough of them
+			max_support: Largest support of the sparse beliefs before 
+			falling back to dense beliefs, a tenth of the world by default
+			log_domain: If the beliefs should be kept as a LogBelief, 
+			which can't be combined with the other modes
 		"""
-		self.grid = grid
-		self.beliefs = localizer.initialize_beliefs(self.grid)
-		self.height = len(grid)
-		self.width  = len(grid[0])
+		if log_domain and (double_buffered or sparse_floor is not None):
+			raise ValueError('log_domain beliefs can be neither double buffered nor sparse')
+		self.world = grid if isinstance(grid, World) else World(grid)
+		self.double_buffered = double_buffered
+		self.sparse_floor = sparse_floor
+		# Only the labels of the world are read, a shared World 
+		# doesn't need its grid of colors.
+		self.height, self.width = self.world.shape
+		if log_domain:
+			self.beliefs = LogBelief.uniform(self.height, self.width)
+		else:
+			self.beliefs = localizer.initialize_beliefs(self.world.labels)
 		self.blur   = blur
 		self.p_hit = p_hit
 		self.p_miss = 1.0
@@ -51,8 +79,34 @@ class Simulation(object):
 		else:
 			self.true_pose = start_pos
 		self.prev_pose = self.true_pose
+		self.max_support = max_support if max_support else max(1, self.height * self.width // 10)
+		if double_buffered:
+			self.prepare_buffers()
 		self.prepare_visualizer()
 
+	@property
+	def grid(self) -> List[List[str]]:
+		"""2D grid of colors representing the robot world"""
+		return self.world.grid
+
+	def prepare_buffers(self) -> None:
+		"""Allocates everything the double buffered steps need up 
+		front, so that stepping doesn't allocate any grid. The move 
+		step writes from the front buffer, which is self.beliefs, 
+		into the back buffer and then swaps both.
+		"""
+		self._window: np.ndarray = as_window(self.blur)
+		cy: int = self._window.shape[0] // 2
+		cx: int = self._window.shape[1] // 2
+		self.beliefs = np.array(self.beliefs, dtype=np.float64)
+		self._back: np.ndarray = np.empty_like(self.beliefs)
+		self._scratch: np.ndarray = np.empty_like(self.beliefs)
+		self._padded: np.ndarray = np.empty((self.height + 2 * cy, self.width + 2 * cx))
+		self._center: np.ndarray = self._padded[cy:cy+self.height, cx:cx+self.width]
+		# A window wider than the world wraps around it more than 
+		# once, which only np.pad can do
+		self._wrap_in_place: bool = cy <= self.height and cx <= self.width
+
 	def prepare_visualizer(self) -> None:
 		"""Initializes the properties, which would maintain the move coordinates and 
 		associated uncertainties of the robot as it moves.
@@ -65,14 +119,11 @@ class Simulation(object):
 		"""Creates a list of all colors from the  robot world
 
 		Returns:
-			All colors as the list of the strings
+			All colors as the list of the strings, in order of 
+			their first appearance
 		"""
-		all_colors: List[str] = []
-		for row in self.grid:
-			for cell in row:
-				if cell not in all_colors:
-					all_colors.append(cell)
-		return all_colors
+		# The world has found its colors while encoding the grid
+		return list(self.world.colors)
 
 	def sense(self) -> None:
 		"""Implements the belief state update logic for the robot. It 
@@ -82,15 +133,24 @@ class Simulation(object):
 		on the sensor measurement.
 		"""
 		color: str = self.get_observed_color()
-		beliefs: List[List[float]] = deepcopy(self.beliefs)
+		if isinstance(self.beliefs, SparseBelief):
+			self.beliefs.sense(color, self.world, self.p_hit, self.p_miss)
+			return
+		if self.double_buffered:
+			np.multiply(self.beliefs, self.world.likelihood(color, self.p_hit, self.p_miss), out=self.beliefs)
+			self.beliefs /= self.beliefs.sum()
+			self.update_sparsity()
+			return
+		# The localizer leaves list of lists beliefs untouched, so 
+		# they don't need to be copied.
 		new_beliefs: List[List[float]] = localizer.sense(
-			color, self.grid, beliefs, self.p_hit, self.p_miss
+			color, self.world, self.beliefs, self.p_hit, self.p_miss
 		)
 		if not new_beliefs or len(new_beliefs) == 0:
 			print("NOTE! The robot doesn't have a working sense function at this point.")
-			self.beliefs = beliefs
 		else:
 			self.beliefs = new_beliefs
+			self.update_sparsity()
 
 	def move(self, dy: int, dx: int) -> None:
 		"""Moves the robot in its grid world w.r.t. the provided 
@@ -114,9 +174,54 @@ class Simulation(object):
 		self.true_pose = (new_y, new_x)
 		# Update the belief of the robot about its location in its world
 		# and maintan the same in the current state
-		beliefs = deepcopy(self.beliefs)
-		new_beliefs = localizer.move(dy, dx, beliefs, self.blur)
-		self.beliefs = new_beliefs
+		if isinstance(self.beliefs, SparseBelief):
+			self.beliefs.move(dy, dx, self.blur)
+		elif self.double_buffered:
+			# Shift the front buffer into the center of the padded 
+			# grid, blur it into the back buffer and swap the buffers.
+			cy: int = self._window.shape[0] // 2
+			cx: int = self._window.shape[1] // 2
+			roll_into(self.beliefs, dy, dx, self._center)
+			if self._wrap_in_place:
+				wrap_pad(self._padded, cy, cx)
+			else:
+				self._padded[...] = np.pad(self._center, ((cy, cy), (cx, cx)), mode='wrap')
+			convolve_padded(self._padded, self._window, self._back, self._scratch)
+			self._back /= self._back.sum()
+			self.beliefs, self._back = self._back, self.beliefs
+		else:
+			self.beliefs = localizer.move(dy, dx, self.beliefs, self.blur)
+		self.update_sparsity()
+
+	def update_sparsity(self) -> None:
+		"""Switches the beliefs to a SparseBelief once at most half 
+		of max_support cells are above the sparse floor, and back to 
+		dense beliefs once the support grows beyond max_support. The 
+		gap between both limits keeps the beliefs from switching back 
+		and forth on every step.
+		"""
+		if self.sparse_floor is None:
+			return
+		if isinstance(self.beliefs, SparseBelief):
+			if self.beliefs.support > self.max_support:
+				if self.double_buffered:
+					self.beliefs = self.beliefs.to_dense(out=self._dense)
+				else:
+					self.beliefs = self.beliefs.tolist()
+			return
+		dense: np.ndarray = np.asarray(self.beliefs)
+		if np.count_nonzero(dense >= self.sparse_floor) <= self.max_support // 2:
+			if self.double_buffered:
+				# Hold on to the front buffer for falling back later
+				self._dense: np.ndarray = self.beliefs
+			self.beliefs = SparseBelief.from_dense(dense, self.sparse_floor)
+
+	def dense_beliefs(self) -> Union[List[List[float]], np.ndarray]:
+		"""Returns the beliefs as a dense grid, whatever their 
+		representation is"""
+		if isinstance(self.beliefs, SparseBelief):
+			return self.beliefs.to_dense()
+		return self.beliefs
 
 
 	def get_observed_color(self) -> str:
@@ -133,21 +238,18 @@ class Simulation(object):
 		# and determine color associated with that 
 		# coordinate position.
 		y,x = self.true_pose
-		true_color: str = self.grid[y][x]
+		true_color: str = self.colors[self.world.labels[y, x]]
 		# Implements a bit of uncertainty and error in the 
 		# observations of the robot. If the following condition 
 		# is true then simulator makes an attempt to get color 
 		# which may or may not be true color. If the condition 
 		# is false it chooses the true color.
 		if random.random() < self.incorrect_sense_probability:
-			possible_colors: List[str] = []
 			# Iterate over all possible colors and makes an attempt 
 			# against choosing the true color by populating the 
 			# possible colors with underlying condition and then make 
-			# a random choice.
-			for color in self.colors:
-				if color != true_color and color not in possible_colors:
-					possible_colors.append(color)
+			# a random choice. The colors are unique already.
+			possible_colors: List[str] = [color for color in self.colors if color != true_color]
 			color: str = random.choice(possible_colors)
 		else:
 			color = true_color
@@ -161,24 +263,16 @@ class Simulation(object):
 			past_turn: If the historic turns taken by the robots 
 			need to be shown.
 		"""
-		# Copy previously maintained state about the location of the robot
+		# Keep previously maintained state about the location of the robot
 		# In this case this state was maintaining all the previous positions 
-		# of the robot and its certainties about its locations.
-		if past_turn:
-			X: List[int] = deepcopy(self.X)
-			Y: List[int] = deepcopy(self.Y)
-			P: List[float] = deepcopy(self.P)
-		# Clean up the previously maintained state before refreshing he same 
-		# with the current belief
-		del(self.X[:])
-		del(self.Y[:])
-		del(self.P[:])
+		# of the robot and its certainties about its locations. The state 
+		# is replaced below, so it doesn't need to be copied.
+		X, Y, P = self.X, self.Y, self.P
 		# Updates the state of the location of the robot with the current belief
-		for y, row in enumerate(self.beliefs):
-			for x, belief in enumerate(row):
-				self.X.append(x)
-				self.Y.append(self.height-y-1) # puts large y ABOVE small y
-				self.P.append(5000.0 * belief)
+		ys, xs = np.indices((self.height, self.width))
+		self.X = xs.ravel().tolist()
+		self.Y = (self.height - ys - 1).ravel().tolist() # puts large y ABOVE small y
+		self.P = (5000.0 * np.asarray(self.dense_beliefs(), dtype=np.float64)).ravel().tolist()
 
 		plt.figure()
 		# If past_turn is True, scatter plot should include the previous position
@@ -191,6 +285,24 @@ class Simulation(object):
 		plt.scatter([self.true_pose[1]], [self.height-self.true_pose[0]-1], color='red', marker="*", s=200)
 		plt.show()
 
+	def render(self, path: str = None) -> np.ndarray:
+		"""Draws the belief of the robot as a heatmap without displaying 
+		it. The renderer is created on the first call and reused, so 
+		that every further frame only updates its data.
+
+		Args:
+			path: Optional path of a PNG file to write the frame to
+
+		Returns:
+			RGBA array of the frame, overwritten by the next render
+		"""
+		if getattr(self, '_renderer', None) is None:
+			self._renderer: BeliefRenderer = BeliefRenderer(self.height, self.width)
+		self._renderer.update(self.dense_beliefs(), self.true_pose, self.prev_pose)
+		if path is not None:
+			return self._renderer.save(path)
+		return self._renderer.render()
+
 	@staticmethod
 	def random_move() -> Tuple[int, int]:
 		"""Randomly determines a step to take. This means 
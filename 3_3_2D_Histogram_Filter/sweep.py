@@ -0,0 +1,158 @@
+import os
+import time
+import random
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Tuple
+import numpy as np
+from world import World
+from simulate import Simulation
+from helpers import is_robot_localized
+
+
+# World of the worker process and the shared memory block its labels
+# view, which stays attached as long as the worker lives
+_worker_world: World = None
+_worker_block: shared_memory.SharedMemory = None
+
+
+def _init_worker(name: str, shape: Tuple[int, int], colors: List[str]) -> None:
+    """Attaches the shared memory block of the labels of the world
+    and creates the World for all tasks of the worker on a read-only
+    view of it, without copying or encoding the colors again"""
+    global _worker_world, _worker_block
+    _worker_block = shared_memory.SharedMemory(name=name)
+    labels: np.ndarray = np.ndarray(shape, dtype=np.int64, buffer=_worker_block.buf)
+    labels.flags.writeable = False
+    _worker_world = World.from_labels(labels, colors)
+
+
+def run_one(task: Tuple[float, float, int, int]) -> Dict[str, float]:
+    """Runs one simulation of a sweep.
+
+    Args:
+        task: Tuple of the blur, p_hit, seed and the maximum number of steps
+
+    Returns:
+        Dictionary of the parameters, the first step at which the robot
+        was localized (None if never), whether its final best guess is
+        correct and the seconds the run took
+    """
+    blur, p_hit, seed, max_steps = task
+    # Everything random in a run depends on its seed only, not on the
+    # worker it runs on or on the tasks that ran there before.
+    random.seed(seed)
+    height, width = _worker_world.shape
+    start_pos: Tuple[int, int] = (random.randrange(height), random.randrange(width))
+    simulation: Simulation = Simulation(_worker_world, blur, p_hit, start_pos, double_buffered=True)
+    steps_to_localize: int = None
+    start: float = time.perf_counter()
+    for step in range(1, max_steps + 1):
+        simulation.run(1)
+        if steps_to_localize is None and is_robot_localized(simulation.beliefs, simulation.true_pose)[0]:
+            steps_to_localize = step
+    localized, best_pos = is_robot_localized(simulation.beliefs, simulation.true_pose)
+    return {
+        'blur': blur,
+        'p_hit': p_hit,
+        'seed': seed,
+        'steps_to_localize': steps_to_localize,
+        'correct': best_pos == simulation.true_pose,
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def sweep(grid: List[List[str]], blurs: List[float], p_hits: List[float], seeds: List[int],
+          max_steps: int = 100, processes: int = None) -> List[Dict[str, float]]:
+    """Runs a simulation for every combination of blur, p_hit and seed
+    on a process pool. The world is put into shared memory once, as
+    integer labels, instead of being pickled with every task.
+
+    Args:
+        grid: 2D grid representing the robot world
+        blurs: Blurring factors to try
+        p_hits: Hit factors to try
+        seeds: Seeds of the runs of every parameter combination
+        max_steps: Number of steps of every run
+        processes: Number of worker processes, by default one per CPU
+
+    Returns:
+        Results of all runs, see run_one, in the order of the tasks
+    """
+    world: World = World(grid)
+    labels: np.ndarray = world.labels.astype(np.int64)
+    block: shared_memory.SharedMemory = shared_memory.SharedMemory(create=True, size=max(labels.nbytes, 1))
+    try:
+        np.ndarray(labels.shape, dtype=np.int64, buffer=block.buf)[...] = labels
+        tasks: List[Tuple[float, float, int, int]] = [
+            (blur, p_hit, seed, max_steps) for blur, p_hit, seed in itertools.product(blurs, p_hits, seeds)
+        ]
+        processes = processes or os.cpu_count() or 1
+        # A few chunks per worker keep the pool balanced without 
+        # sending every task on its own
+        chunksize: int = max(1, len(tasks) // (4 * processes))
+        with ProcessPoolExecutor(processes, initializer=_init_worker,
+                                 initargs=(block.name, labels.shape, world.colors)) as pool:
+            return list(pool.map(run_one, tasks, chunksize=chunksize))
+    finally:
+        block.close()
+        block.unlink()
+
+
+def summarize(results: List[Dict[str, float]]) -> List[Dict[str, float]]:
+    """Aggregates the runs of every combination of blur and p_hit.
+
+    Args:
+        results: Results of the runs of a sweep
+
+    Returns:
+        One row per parameter combination with the number of runs, the
+        fraction of runs which got localized, the mean and median number
+        of steps to get localized, the fraction of correct final guesses
+        and the mean seconds per run
+    """
+    groups: Dict[Tuple[float, float], List[Dict[str, float]]] = {}
+    for result in results:
+        groups.setdefault((result['blur'], result['p_hit']), []).append(result)
+    rows: List[Dict[str, float]] = []
+    for (blur, p_hit), runs in sorted(groups.items()):
+        steps: List[int] = [run['steps_to_localize'] for run in runs if run['steps_to_localize'] is not None]
+        rows.append({
+            'blur': blur,
+            'p_hit': p_hit,
+            'runs': len(runs),
+            'localized': len(steps) / len(runs),
+            'mean_steps': float(np.mean(steps)) if steps else float('nan'),
+            'median_steps': float(np.median(steps)) if steps else float('nan'),
+            'accuracy': float(np.mean([run['correct'] for run in runs])),
+            'seconds': float(np.mean([run['seconds'] for run in runs])),
+        })
+    return rows
+
+
+def format_table(rows: List[Dict[str, float]]) -> str:
+    lines: List[str] = [f'{"blur":>6} {"p_hit":>7} {"runs":>5} {"localized":>9} {"mean":>6} {"median":>6} {"accuracy":>8} {"s/run":>7}']
+    for row in rows:
+        lines.append(f'{row["blur"]:>6.3f} {row["p_hit"]:>7.1f} {row["runs"]:>5} {row["localized"]:>9.1%} '
+                     f'{row["mean_steps"]:>6.1f} {row["median_steps"]:>6.1f} {row["accuracy"]:>8.1%} {row["seconds"]:>7.3f}')
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, default=25)
+    parser.add_argument('--colors', nargs='+', default=['r', 'g'])
+    parser.add_argument('--blurs', type=float, nargs='+', default=[0.0, 0.05, 0.12, 0.25])
+    parser.add_argument('--p-hits', type=float, nargs='+', default=[5.0, 20.0, 200.0])
+    parser.add_argument('--seeds', type=int, default=20)
+    parser.add_argument('--steps', type=int, default=100)
+    parser.add_argument('--processes', type=int)
+    args = parser.parse_args()
+
+    grid: List[List[str]] = np.random.default_rng(0).choice(args.colors, (args.size, args.size)).tolist()
+    start: float = time.perf_counter()
+    results: List[Dict[str, float]] = sweep(grid, args.blurs, args.p_hits, list(range(args.seeds)), args.steps, args.processes)
+    print(format_table(summarize(results)))
+    print(f'{len(results)} runs in {time.perf_counter() - start:.1f} s')
@@ -0,0 +1,131 @@
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+import numpy as np
+
+
+class World(object):
+    """Robot world encoded once as an integer label array, so that
+    the sense step gathers the likelihood of every cell instead of
+    comparing color strings. The likelihood grids of the observed
+    colors are cached.
+
+    Attributes:
+        grid: The robot world as list of lists of colors, built from
+        the labels on first use if the World was created from them
+        colors: All colors of the world, in order of appearance
+        labels: 2D array of the index of the color of every cell
+        max_cached: Largest number of cached likelihood grids
+    """
+
+    colors: List[str]
+    labels: np.ndarray
+    max_cached: int
+
+    def __init__(self, grid: List[List[str]], max_cached: int = 16) -> None:
+        """Initializes World
+
+        Args:
+            grid: 2D grid of colors representing the robot world
+            max_cached: Largest number of cached likelihood grids, the
+            least recently used one is dropped first
+        """
+        self._grid: List[List[str]] = grid
+        cells: np.ndarray = np.asarray(grid)
+        # np.unique sorts the colors, relabel them in order of their
+        # first appearance, which is the order of the original list
+        # of colors.
+        colors, first, labels = np.unique(cells.ravel(), return_index=True, return_inverse=True)
+        order: np.ndarray = np.argsort(first)
+        ranks: np.ndarray = np.empty_like(order)
+        ranks[order] = np.arange(len(order))
+        self.colors = colors[order].tolist()
+        self.labels = ranks[labels.ravel()].reshape(cells.shape)
+        self._index: Dict[str, int] = {color: i for i, color in enumerate(self.colors)}
+        self.max_cached = max_cached
+        self._cache: OrderedDict = OrderedDict()
+
+    @classmethod
+    def from_labels(cls, labels: np.ndarray, colors: List[str], max_cached: int = 16) -> 'World':
+        """Creates a World from an already encoded grid, without 
+        encoding the colors again. The labels are used as they are, 
+        e.g. as a read-only view of shared memory, and the grid of 
+        colors is only built if it is asked for.
+
+        Args:
+            labels: 2D array of the index of the color of every cell, 
+            not copied
+            colors: All colors of the world, in order of appearance
+            max_cached: Largest number of cached likelihood grids
+
+        Returns:
+            The World of the labels
+        """
+        world: World = cls.__new__(cls)
+        world.labels = labels
+        world.colors = list(colors)
+        world._grid = None
+        world._index = {color: i for i, color in enumerate(world.colors)}
+        world.max_cached = max_cached
+        world._cache = OrderedDict()
+        return world
+
+    @property
+    def grid(self) -> List[List[str]]:
+        if self._grid is None:
+            self._grid = np.asarray(self.colors, dtype=object)[self.labels].tolist()
+        return self._grid
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.labels.shape
+
+    def label(self, color: str) -> int:
+        """Returns the label of a color, or -1 if the color doesn't
+        appear in the world"""
+        return self._index.get(color, -1)
+
+    def lookup(self, color: str, p_hit: float, p_miss: float, log: bool = False) -> np.ndarray:
+        """Creates the likelihood of every label for an observed color.
+
+        Args:
+            color: Observation by the robot i.e. the sensor measurement
+            p_hit: Factor to consider if the measurement is correct
+            p_miss: Factor to consider if the measurement is incorrect
+            log: If the log-likelihoods should be returned instead
+
+        Returns:
+            Array of the likelihoods, indexed by label
+        """
+        if log:
+            p_hit, p_miss = np.log(p_hit), np.log(p_miss)
+        table: np.ndarray = np.full(len(self.colors), p_miss, dtype=np.float64)
+        label: int = self.label(color)
+        if label >= 0:
+            table[label] = p_hit
+        return table
+
+    def likelihood(self, color: str, p_hit: float, p_miss: float, log: bool = False) -> np.ndarray:
+        """Returns the likelihood of every cell for an observed color.
+        The grid is gathered from the lookup table by the labels once
+        and then served from the cache.
+
+        Args:
+            color: Observation by the robot i.e. the sensor measurement
+            p_hit: Factor to consider if the measurement is correct
+            p_miss: Factor to consider if the measurement is incorrect
+            log: If the log-likelihoods should be returned instead
+
+        Returns:
+            2D array of the likelihoods, must not be modified
+        """
+        key: Tuple[str, float, float, bool] = (color, p_hit, p_miss, log)
+        grid: np.ndarray = self._cache.get(key)
+        if grid is None:
+            grid = self.lookup(color, p_hit, p_miss, log)[self.labels]
+            grid.flags.writeable = False
+            self._cache[key] = grid
+            if len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(key)
+        return grid
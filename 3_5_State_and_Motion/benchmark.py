@@ -0,0 +1,93 @@
+import time
+import argparse
+from typing import Callable, List
+import numpy as np
+from matrix import Matrix, zeroes
+from car import Car, CarFleet
+
+
+def time_call(fn: Callable[[], object], min_time: float = 0.05) -> float:
+    """Times a call, repeating it until at least min_time has 
+    passed, and returns the mean seconds per call"""
+    fn()
+    calls: int = 0
+    start: float = time.perf_counter()
+    while True:
+        fn()
+        calls += 1
+        elapsed: float = time.perf_counter() - start
+        if elapsed >= min_time:
+            return elapsed / calls
+
+
+def multiply_lists(a: List[List[float]], b: List[List[float]]) -> List[List[float]]:
+    """The triple loop Matrix used before it was backed by NumPy"""
+    product: List[List[float]] = zeroes(len(a), len(b[0]))
+    for i in range(len(a)):
+        for j in range(len(b[0])):
+            for k in range(len(b)):
+                product[i][j] += a[i][k] * b[k][j]
+    return product
+
+
+def benchmark_multiply(sizes: List[int], max_loop_size: int) -> None:
+    """Times the product of two square matrices with the triple loop 
+    and with the NumPy backed Matrix"""
+    print(f'{"size":>6} {"loops":>12} {"Matrix":>12} {"speedup":>9}')
+    for size in sizes:
+        a: Matrix = Matrix(np.random.rand(size, size))
+        b: Matrix = Matrix(np.random.rand(size, size))
+        matrix_time: float = time_call(lambda: a * b)
+        if size <= max_loop_size:
+            grid_a, grid_b = a.data.tolist(), b.data.tolist()
+            loop_time: float = time_call(lambda: multiply_lists(grid_a, grid_b))
+            assert np.allclose(multiply_lists(grid_a, grid_b), (a * b).data)
+            print(f'{size:>6} {loop_time * 1000:11.3f}m {matrix_time * 1000:11.3f}m {loop_time / matrix_time:8.0f}x')
+        else:
+            print(f'{size:>6} {"-":>12} {matrix_time * 1000:11.3f}m {"-":>9}')
+
+
+def benchmark_fleet(num_cars: int, num_steps: int, size: int = 100) -> None:
+    """Times moving and turning a list of Car objects against a 
+    CarFleet of the same cars"""
+    rng: np.random.Generator = np.random.default_rng(0)
+    world: np.ndarray = np.zeros((size, size))
+    positions: np.ndarray = rng.integers(0, size, (num_cars, 2))
+    velocities: np.ndarray = rng.integers(-2, 3, (num_cars, 2))
+    turns: np.ndarray = rng.random((num_steps, num_cars)) < 0.1
+
+    cars: List[Car] = [Car(tuple(p), tuple(v), world) for p, v in zip(positions.tolist(), velocities.tolist())]
+    start: float = time.perf_counter()
+    for step in range(num_steps):
+        for car, turn in zip(cars, turns[step]):
+            car.move()
+            if turn:
+                car.turn_left()
+    cars_time: float = time.perf_counter() - start
+
+    fleet: CarFleet = CarFleet(positions, velocities, world)
+    start = time.perf_counter()
+    for step in range(num_steps):
+        fleet.move()
+        fleet.turn_left(turns[step])
+    fleet_time: float = time.perf_counter() - start
+
+    assert all(fleet.state(i)[0] == tuple(int(v) for v in car.state[0]) for i, car in enumerate(cars))
+    print(f'{num_cars} cars, {num_steps} steps')
+    print(f'Car list {cars_time * 1000:9.1f} ms')
+    print(f'CarFleet {fleet_time * 1000:9.1f} ms  ({cars_time / fleet_time:.0f}x faster)')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('benchmark', choices=['multiply', 'fleet'])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[4, 8, 16, 32, 64, 128, 256, 512])
+    parser.add_argument('--max-loop-size', type=int, default=128)
+    parser.add_argument('--cars', type=int, default=10000)
+    parser.add_argument('--steps', type=int, default=100)
+    args = parser.parse_args()
+
+    if args.benchmark == 'multiply':
+        benchmark_multiply(args.sizes, args.max_loop_size)
+    elif args.benchmark == 'fleet':
+        benchmark_fleet(args.cars, args.steps)
@@ -84,11 +84,9 @@ class Car(object):
         """
         # Change the velocity
         velocity: Tuple[int, int] = self.state[1]  # (vy, vx)
-        velocity_arr: np.ndarray = np.array([velocity[0], velocity[1]])
-        # Left rotation tranformation for (vy, vx)
-        left_rotate_transformer: np.ndarray = np.array([[0, -1], [1, 0]])
-        left_rotated: np.ndarray = left_rotate_transformer  @ velocity_arr
-        predicted_velocity: Tuple[int, int] = (left_rotated[0], left_rotated[1])
+        # Left rotation tranformation [[0, -1], [1, 0]] for (vy, vx), 
+        # written out for the two elements
+        predicted_velocity: Tuple[int, int] = (-velocity[1], velocity[0])
         # Update the state velocity
         self.state[1] = predicted_velocity
 
@@ -101,11 +99,9 @@ class Car(object):
         """
         # Change the velocity
         velocity: Tuple[int, int] = self.state[1]  # (vy, vx)
-        velocity_arr: np.ndarray = np.array([velocity[0], velocity[1]])
-        # Right rotation tranformation for (vy, vx)
-        right_rotate_transformer: np.ndarray = np.array([[0, 1], [-1, 0]])
-        right_rotated: np.ndarray = right_rotate_transformer  @ velocity_arr
-        predicted_velocity: Tuple[int, int] = (right_rotated[0], right_rotated[1])
+        # Right rotation tranformation [[0, 1], [-1, 0]] for (vy, vx), 
+        # written out for the two elements
+        predicted_velocity: Tuple[int, int] = (velocity[1], -velocity[0])
         # Update the state velocity
         self.state[1] = predicted_velocity
     
@@ -144,3 +140,141 @@ class Car(object):
         # Display final result
         plt.show()
 
+
+
+class CarFleet(object):
+    """Moves many cars at once with a constant velocity motion model.
+    The positions and velocities of all cars are kept in (N, 2) arrays 
+    and every step updates all of them with vectorized operations. 
+    The last positions of all cars are kept in a ring buffer of 
+    fixed size.
+
+    Attributes:
+        positions: Integer array of the (y, x) positions of the cars, 
+        of shape (N, 2)
+        velocities: Integer array of the (vy, vx) velocities of the cars, 
+        of shape (N, 2)
+        world: The world that the cars are moving within
+        colors: Colors of the cars
+        history: Number of positions kept per car
+    """
+
+    positions: np.ndarray
+    velocities: np.ndarray
+    world: np.ndarray
+    colors: List[str]
+    history: int
+    _path: np.ndarray # Ring buffer of shape (history, N, 2)
+    _path_end: int # Index of the next slot of the ring buffer
+    _path_len: int # Number of filled slots of the ring buffer
+
+    def __init__(self, positions: np.ndarray, velocities: np.ndarray, 
+                world: np.ndarray, colors: List[str] = None, history: int = 64) -> None:
+        """Initializes the CarFleet
+
+        Args:
+            positions: (N, 2) integers (y, x) to denote the positions of the 
+            cars in 2D world.
+            velocities: (N, 2) integers (vy, vx) to denote the velocities of 
+            the cars in 2D world.
+            world: NumPy array of integers to represent a 2D world.
+            colors: Optional colors of the cars, red by default
+            history: Number of positions to keep per car, including the 
+            initial one
+        """
+        self.positions = np.array(positions, dtype=np.int64).reshape(-1, 2)
+        self.velocities = np.array(velocities, dtype=np.int64).reshape(-1, 2)
+        if self.positions.shape != self.velocities.shape:
+            raise ValueError(f'Expected as many velocities as positions, got {len(self.velocities)} and {len(self.positions)}')
+        self.world = np.asarray(world)
+        self._shape: np.ndarray = np.array(self.world.shape[:2], dtype=np.int64)
+        self.positions %= self._shape
+        self.colors = colors if colors is not None else ['r'] * len(self.positions)
+        self.history = history
+        self._step: np.ndarray = np.empty_like(self.positions)
+        self._path = np.empty((history, len(self.positions), 2), dtype=np.int64)
+        self._path_end = 0
+        self._path_len = 0
+        # Append the initial positions to the path
+        self._record()
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def _record(self) -> None:
+        self._path[self._path_end] = self.positions
+        self._path_end = (self._path_end + 1) % self.history
+        self._path_len = min(self._path_len + 1, self.history)
+
+    def move(self, dt: int = 1) -> None:
+        """Moves all cars in the direction of their velocities. The world 
+        is circular in vertical and horizontal directions.
+
+        Args:
+            dt: Integer steps to move in a world
+        """
+        np.multiply(self.velocities, dt, out=self._step)
+        self.positions += self._step
+        np.remainder(self.positions, self._shape, out=self.positions)
+        self._record()
+
+    def _select(self, mask: np.ndarray) -> np.ndarray:
+        # Boolean mask or indices of the cars, all cars if None
+        if mask is None:
+            return slice(None)
+        return np.asarray(mask)
+
+    def turn_left(self, mask: np.ndarray = None) -> None:
+        """Turns the selected cars left, (vy, vx) becomes (-vx, vy).
+
+        Args:
+            mask: Boolean mask or indices of the cars to turn, all cars 
+            by default
+        """
+        selected = self._select(mask)
+        vy: np.ndarray = self.velocities[selected, 0].copy()
+        self.velocities[selected, 0] = -self.velocities[selected, 1]
+        self.velocities[selected, 1] = vy
+
+    def turn_right(self, mask: np.ndarray = None) -> None:
+        """Turns the selected cars right, (vy, vx) becomes (vx, -vy).
+
+        Args:
+            mask: Boolean mask or indices of the cars to turn, all cars 
+            by default
+        """
+        selected = self._select(mask)
+        vy: np.ndarray = self.velocities[selected, 0].copy()
+        self.velocities[selected, 0] = self.velocities[selected, 1]
+        self.velocities[selected, 1] = -vy
+
+    def path(self, index: int = None) -> np.ndarray:
+        """Returns the kept positions in the order they were visited.
+
+        Args:
+            index: Optional index of a single car
+
+        Returns:
+            Array of shape (steps, N, 2), or (steps, 2) for a single car
+        """
+        start: int = (self._path_end - self._path_len) % self.history
+        order: np.ndarray = (start + np.arange(self._path_len)) % self.history
+        if index is None:
+            return self._path[order]
+        return self._path[order, index]
+
+    def state(self, index: int) -> Constant_Velocity_State_t:
+        """Returns the state of a car in the form of Car.state"""
+        return [tuple(self.positions[index].tolist()), tuple(self.velocities[index].tolist())]
+
+    def display_world(self, show_path: bool = False) -> None:
+        """Displays the world along with the positions of the cars in it"""
+        plt.matshow(self.world, cmap='gray')
+        ax: Axes = plt.gca()
+        if show_path and self._path_len > 1:
+            path: np.ndarray = self.path()[:-1]
+            for color in set(self.colors):
+                cars: np.ndarray = np.array([c == color for c in self.colors])
+                ax.scatter(path[:, cars, 1].ravel(), path[:, cars, 0].ravel(), color=color, marker='.', s=20)
+        ax.scatter(self.positions[:, 1], self.positions[:, 0], c=self.colors, marker='x', s=60)
+        plt.show()
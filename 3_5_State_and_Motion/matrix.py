@@ -1,5 +1,7 @@
 from __future__ import annotations
-from typing import List
+from numbers import Integral, Number
+from typing import List, Union
+import numpy as np
 
 
 def zeroes(height: int, width: int) -> List[List[float]]:
@@ -10,59 +12,139 @@ def zeroes(height: int, width: int) -> List[List[float]]:
 
 class Matrix(object):
 
-    grid: List[List[float]]
-    rows: int
-    cols: int
-    
-    # Initializes a matrix from a 2D grid of values
-    # Assumes and initializes a grid-specified number of rows and columns
-    def __init__(self, grid: List[List[float]]) -> None:
+    data: np.ndarray
+
+    # Initializes a matrix from a 2D grid of values, a list of lists or
+    # an array. The values are kept in a float64 array, so that the
+    # products run on BLAS.
+    def __init__(self, grid: Union[List[List[float]], np.ndarray]) -> None:
         self.grid = grid
-        self.rows = len(grid)
-        self.cols = len(grid[0])
-    
+        if self.data.ndim != 2:
+            raise ValueError(f'Expected a 2D grid of values, got {self.data.ndim} dimensions')
+
+    @classmethod
+    def identity(cls, n: int) -> Matrix:
+        ''' Creates the n x n identity matrix. '''
+        return cls._wrap(np.eye(n))
+
+    # Wraps the result of an operation without copying it again.
+    # Integer matrices keep printing their values as integers.
+    @classmethod
+    def _wrap(cls, data: np.ndarray, integer: bool = False) -> Matrix:
+        matrix: Matrix = cls.__new__(cls)
+        matrix.data = data
+        matrix._integer = integer
+        return matrix
+
+    # The values as list of lists of Python numbers, integral values
+    # of an integer matrix as int
+    def _values(self) -> List[List[float]]:
+        values: List[List[float]] = self.data.tolist()
+        if self._integer:
+            values = [[int(v) if v.is_integer() else v for v in row] for row in values]
+        return values
+
+    # The grid is the array itself, so that m.grid[i][j] = v, row
+    # and slice assignments and in-place operations change the matrix
+    # like they did when the grid was the storage, while list methods
+    # like append raise instead of changing a copy
+    @property
+    def grid(self) -> np.ndarray:
+        return self.data
+
+    @grid.setter
+    def grid(self, grid: List[List[float]]) -> None:
+        values: np.ndarray = np.asarray(grid)
+        self._integer = values.dtype.kind in 'iu'
+        self.data = np.array(values, dtype=np.float64, ndmin=2)
+
+    @property
+    def rows(self) -> int:
+        return self.data.shape[0]
+
+    @property
+    def cols(self) -> int:
+        return self.data.shape[1]
+
     # Overloading the multiplication operator
-    def __mul__(self, other: Matrix) -> Matrix:
+    def __mul__(self, other: Union[Matrix, float]) -> Matrix:
         ''' self and other are Matrix objects.
-        This function check the dimensions of the two matrices, 
-        multiplies them according to the rules of linear algebra, 
-        and returns a new matrix.'''
+        This function check the dimensions of the two matrices,
+        multiplies them according to the rules of linear algebra,
+        and returns a new matrix. A number scales the matrix.'''
+        if isinstance(other, Number):
+            return Matrix._wrap(self.data * other, self._integer and isinstance(other, Integral))
+        return self.__matmul__(other)
+
+    def __rmul__(self, other: float) -> Matrix:
+        if isinstance(other, Number):
+            return Matrix._wrap(other * self.data, self._integer and isinstance(other, Integral))
+        raise ValueError(f'Unsupported operand, expected Matrix, got: {type(other)}')
+
+    def __matmul__(self, other: Matrix) -> Matrix:
         if not isinstance(other, Matrix):
             raise ValueError(f'Unsupported operand, expected Matrix, got: {type(other)}')
         # Check for dim compatibility
-        if(self.cols == other.rows):
-            # Create a new matrix of zeroes of the appropriate size (self.rows x other.cols)
-            self_times_other: List[List[float]] = zeroes(self.rows, other.cols)
-            # iterate through the rows of self
-            for i in range(self.rows):
-                # iterate through the columns of other
-                for j in range(other.cols):
-                    # iterate through rows of other and sum
-                    for k in range(other.rows):
-                        # multiply and sum step
-                        self_times_other[i][j] += (self[i][k] * other[k][j])
-            return Matrix(grid=self_times_other)
-        else:
+        if self.cols != other.rows:
             print('Invalid matrix dimensions!')
             print('A_cols = ' + str(self.cols) + ', and B_rows = ' + str(other.rows))
             raise RuntimeError('Incompatible dimensions for operands')
-        
-        
-    # Overloading indexing
-    def __getitem__(self, index: int) -> List[float]:
-        return self.grid[index]
-        
+        return Matrix._wrap(self.data @ other.data)
+
+    def __add__(self, other: Matrix) -> Matrix:
+        return Matrix._wrap(self.data + self._same_shape(other).data, self._integer and other._integer)
+
+    def __sub__(self, other: Matrix) -> Matrix:
+        return Matrix._wrap(self.data - self._same_shape(other).data, self._integer and other._integer)
+
+    def __neg__(self) -> Matrix:
+        return Matrix._wrap(-self.data, self._integer)
+
+    def _same_shape(self, other: Matrix) -> Matrix:
+        if not isinstance(other, Matrix):
+            raise ValueError(f'Unsupported operand, expected Matrix, got: {type(other)}')
+        if self.data.shape != other.data.shape:
+            raise RuntimeError(f'Incompatible dimensions for operands, {self.rows}x{self.cols} and {other.rows}x{other.cols}')
+        return other
+
+    def transpose(self) -> Matrix:
+        ''' Returns the transpose of the matrix. '''
+        return Matrix._wrap(self.data.T.copy(), self._integer)
+
+    @property
+    def T(self) -> Matrix:
+        return self.transpose()
+
+    def inverse(self) -> Matrix:
+        ''' Returns the inverse of a square, non-singular matrix. '''
+        if self.rows != self.cols:
+            raise RuntimeError(f'Only square matrices can be inverted, got {self.rows}x{self.cols}')
+        try:
+            return Matrix._wrap(np.linalg.inv(self.data))
+        except np.linalg.LinAlgError:
+            raise RuntimeError('Matrix is singular and cannot be inverted')
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        return np.asarray(self.data, dtype=dtype)
+
+    # Overloading indexing, rows are views, so m[i][j] = v writes
+    # into the matrix
+    def __getitem__(self, index: int) -> np.ndarray:
+        return self.data[index]
+
+    def __setitem__(self, index: int, value: List[float]) -> None:
+        self.data[index] = value
+
+    def __len__(self) -> int:
+        return self.rows
+
     # Overloading print output
     def __repr__(self) -> str:
         s = '['
-        for row in self.grid:
+        for row in self._values():
             s += '['
             for item in row:
                 s += str(item) +' '
             s += ']\n'
         s += ']'
         return s
-
-
-        
-    
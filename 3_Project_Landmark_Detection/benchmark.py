@@ -0,0 +1,83 @@
+import time
+import argparse
+from typing import Any, List
+import numpy as np
+from slam import slam, slam_dense, get_poses_landmarks, OnlineSLAM
+
+
+def synthesize_data(N: int, num_landmarks: int, world_size: float, motion_noise: float, measurement_noise: float,
+                    distance: float, per_step: int = 3, seed: int = 0) -> Any:
+    """Creates data in the format of make_data much faster, for large N.
+    The robot takes random steps starting in the middle of the world and
+    measures per_step random landmarks at every time step, so that every
+    landmark is seen when N is large enough."""
+    rng: np.random.Generator = np.random.default_rng(seed)
+    landmarks: np.ndarray = rng.random((num_landmarks, 2)) * world_size
+    angles: np.ndarray = rng.random(N - 1) * 2.0 * np.pi
+    motions: np.ndarray = np.stack([np.cos(angles), np.sin(angles)], axis=1) * distance
+    noise: np.ndarray = (rng.random((N - 1, 2)) * 2.0 - 1.0) * motion_noise
+    poses: np.ndarray = world_size / 2.0 + np.concatenate([np.zeros((1, 2)), np.cumsum(motions + noise, axis=0)])
+    data: List[Any] = []
+    for ts in range(N - 1):
+        seen: np.ndarray = rng.choice(num_landmarks, min(per_step, num_landmarks), replace=False)
+        offsets: np.ndarray = landmarks[seen] - poses[ts] + (rng.random((len(seen), 2)) * 2.0 - 1.0) * measurement_noise
+        data.append([[[int(i), dx, dy] for i, (dx, dy) in zip(seen, offsets.tolist())], motions[ts].tolist()])
+    return data
+
+
+def benchmark_slam(sizes: List[int], num_landmarks: int, max_dense: int) -> None:
+    """Times the dense slam against the sparse slam with both solvers"""
+    print(f'{"poses":>7} {"dense":>10} {"cholesky":>10} {"cg":>10}  {"max difference":>14}')
+    for N in sizes:
+        data: Any = synthesize_data(N, num_landmarks, 100.0, 2.0, 2.0, 20.0)
+        times: List[str] = []
+        results: List[np.ndarray] = []
+        for name, fn in [('dense', slam_dense), ('cholesky', slam), ('cg', lambda *args: slam(*args, method='cg'))]:
+            if name == 'dense' and N > max_dense:
+                times.append(f'{"-":>10}')
+                continue
+            start: float = time.perf_counter()
+            results.append(fn(data, N, num_landmarks, 100.0, 2.0, 2.0))
+            times.append(f'{time.perf_counter() - start:9.3f}s')
+        difference: float = max(np.abs(result - results[0]).max() for result in results)
+        print(f'{N:>7} {" ".join(times)}  {difference:>14.2e}')
+
+
+def benchmark_online(N: int, num_landmarks: int, window: int) -> None:
+    """Times the steps of OnlineSLAM over a long run and compares its final
+    estimate with the sparse slam over all poses"""
+    data: Any = synthesize_data(N, num_landmarks, 100.0, 2.0, 2.0, 20.0)
+    online: OnlineSLAM = OnlineSLAM(num_landmarks, 100.0, 2.0, 2.0, window)
+    times: np.ndarray = np.empty(len(data))
+    for ts, (measurements, motion) in enumerate(data):
+        start: float = time.perf_counter()
+        online.step(measurements, motion)
+        times[ts] = time.perf_counter() - start
+    start = time.perf_counter()
+    poses, landmarks = online.estimate()
+    solve: float = time.perf_counter() - start
+    print(f'{"steps":>13} {"mean":>10} {"max":>10}')
+    for chunk in np.array_split(np.arange(len(data)), 5):
+        print(f'{chunk[0]:>6}-{chunk[-1]:<6} {times[chunk].mean() * 1e6:8.1f}us {times[chunk].max() * 1e6:8.1f}us')
+    print(f'estimate of {len(poses)} poses and {num_landmarks} landmarks in {solve * 1e3:.2f} ms')
+    mu: np.ndarray = slam(data, N, num_landmarks, 100.0, 2.0, 2.0)
+    full_poses, full_landmarks = get_poses_landmarks(mu, N, num_landmarks)
+    difference: float = max(np.abs(poses - np.array(full_poses[N - len(poses):])).max(),
+                            np.nanmax(np.abs(landmarks - np.array(full_landmarks))))
+    print(f'max difference to slam over all {N} poses: {difference:.2e}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('benchmark', choices=['slam', 'online'])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 500, 1000, 2000, 5000, 20000, 50000])
+    parser.add_argument('--landmarks', type=int, default=50)
+    parser.add_argument('--max-dense', type=int, default=2000)
+    parser.add_argument('--steps', type=int, default=20000)
+    parser.add_argument('--window', type=int, default=10)
+    args = parser.parse_args()
+
+    if args.benchmark == 'slam':
+        benchmark_slam(args.sizes, args.landmarks, args.max_dense)
+    elif args.benchmark == 'online':
+        benchmark_online(args.steps, args.landmarks, args.window)
@@ -1,7 +1,6 @@
 from typing import List, Tuple
 from robot_class import robot
 from math import *
-import random
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.axes import Axes
@@ -41,8 +40,8 @@ def display_world(world_size: int, position: List[float], landmarks: List[Tuple[
     # Draw landmarks if they exists
     if(landmarks is not None):
         # loop through all path indices and draw a dot (unless it's at the car's location)
-        for pos in landmarks:
-            if(pos != position):
+        for pos in np.asarray(landmarks).tolist():
+            if(pos != list(position)):
                 ax.text(pos[0], pos[1], 'x', ha='center', va='center', color='purple', fontsize=20)
     
     # Display final result
@@ -55,18 +54,20 @@ def display_world(world_size: int, position: List[float], landmarks: List[Tuple[
 # collected over a specified number of time steps, N
 #
 def make_data(N: int, num_landmarks: int, world_size: float, measurement_range: float, motion_noise: float, 
-              measurement_noise: float, distance: float):
+              measurement_noise: float, distance: float, seed: int = None):
 
     # check that data has been made
     try:
-        check_for_data(num_landmarks, world_size, measurement_range, motion_noise, measurement_noise)
+        check_for_data(num_landmarks, world_size, measurement_range, motion_noise, measurement_noise, seed)
     except ValueError:
         print('Error: You must implement the sense function in robot_class.py.')
         return []
     
     complete: bool = False
     
-    r: robot = robot(world_size, measurement_range, motion_noise, measurement_noise)
+    # The landmarks, the noise and the directions all come from the 
+    # generator of the robot, so the seed reproduces the whole data
+    r: robot = robot(world_size, measurement_range, motion_noise, measurement_noise, seed)
     r.make_landmarks(num_landmarks)
 
     while not complete:
@@ -77,7 +78,7 @@ def make_data(N: int, num_landmarks: int, world_size: float, measurement_range:
         seen: List[bool] = [False for row in range(num_landmarks)]
     
         # guess an initial motion
-        orientation: float = random.random() * 2.0 * pi
+        orientation: float = r.rng.random() * 2.0 * pi
         dx: float = cos(orientation) * distance
         dy: float = sin(orientation) * distance
         # Following iteration condition means, that the initial timestep is 
@@ -94,7 +95,7 @@ def make_data(N: int, num_landmarks: int, world_size: float, measurement_range:
             # move
             while not r.move(dx, dy):
                 # if we'd be leaving the robot world, pick instead a new direction
-                orientation: float = random.random() * 2.0 * pi
+                orientation: float = r.rng.random() * 2.0 * pi
                 dx: float = cos(orientation) * distance
                 dy: float = sin(orientation) * distance
 
@@ -111,9 +112,10 @@ def make_data(N: int, num_landmarks: int, world_size: float, measurement_range:
     return data
 
 
-def check_for_data(num_landmarks: int, world_size: float, measurement_range: float, motion_noise: float, measurement_noise: float) -> None:
+def check_for_data(num_landmarks: int, world_size: float, measurement_range: float, motion_noise: float, measurement_noise: float,
+                   seed: int = None) -> None:
     # make robot and landmarks
-    r: robot = robot(world_size, measurement_range, motion_noise, measurement_noise)
+    r: robot = robot(world_size, measurement_range, motion_noise, measurement_noise, seed)
     r.make_landmarks(num_landmarks)
     
     
@@ -1,6 +1,6 @@
 from typing import List, Tuple
 from math import *
-import random
+import numpy as np
 
 
 class robot:
@@ -23,13 +23,15 @@ class robot:
     x: float  # Robot position coordinate x
     y: float  # Robot position cordinate y
     num_landmarks: int  # Number of landmarks in the robot world
-    landmarks: List[List[float]]  # Landmark coordinates (x, y) in the robot world
+    landmarks: np.ndarray  # Landmark coordinates (x, y) in the robot world, one row per landmark
+    rng: np.random.Generator  # Source of the noise and of the landmark positions
     
 
     def __init__(self, world_size: float = 100.0, measurement_range: float = 30.0,
-                 motion_noise: float = 1.0, measurement_noise: float = 1.0) -> None:
+                 motion_noise: float = 1.0, measurement_noise: float = 1.0, seed: int = None) -> None:
         """Creates a robot with the specified parameters and initializes
-        the location (self.x, self.y) to the center of the world
+        the location (self.x, self.y) to the center of the world. The
+        seed makes the landmarks and the noise reproducible.
         """
         self.measurement_noise = 0.0
         self.world_size = world_size
@@ -38,14 +40,15 @@ class robot:
         self.y = world_size / 2.0
         self.motion_noise = motion_noise
         self.measurement_noise = measurement_noise
-        self.landmarks = []
+        self.rng = np.random.default_rng(seed)
+        self.landmarks = np.empty((0, 2))
         self.num_landmarks = 0
     
     
     # returns a positive, random float
     def rand(self) -> float:
         """Generates a random number"""
-        return random.random() * 2.0 - 1.0
+        return self.rng.random() * 2.0 - 1.0
     
     
     def move(self, dx: int, dy: int) -> bool:
@@ -77,31 +80,23 @@ class robot:
         This function should account for measurement_noise and measurement_range.
         One item in the returned list should be in the form: [landmark_index, dx, dy].
         """
-        measurements: List[Tuple[int, float, float]] = []
-        ## TODO: iterate through all of the landmarks in a world
-        ## TODO: For each landmark
-        ## 1. compute dx and dy, the distances between the robot and the landmark
-        ## 2. account for measurement noise by *adding* a noise component to dx and dy
-        ##    - The noise component should be a random value between [-1.0, 1.0)*measurement_noise
-        ##    - Feel free to use the function self.rand() to help calculate this noise component
-        ## 3. If either of the distances, dx or dy, fall outside of the internal var, measurement_range
-        ##    then we cannot record them; if they do fall in the range, then add them to the measurements list
-        ##    as list.append([index, dx, dy]), this format is important for data creation done later
-        for lix, lnm in enumerate(self.landmarks):
-            # Compute the x and y distances from the landmark
-            dx: float = (lnm[0] - self.x) + (self.rand() * self.measurement_noise)
-            dy: float = (lnm[1] - self.y) + (self.rand() * self.measurement_noise)
-            if self.measurement_range == -1 or dx <= abs(self.measurement_range) and dy <= abs(self.measurement_range):
-                measurements.append((lix, dx, dy))
-        return measurements
+        ## Computes the noisy distances to all landmarks at once, the noise
+        ## of every distance is a random value in [-1.0, 1.0)*measurement_noise,
+        ## and keeps the landmarks whose distances dx and dy are both within
+        ## measurement_range
+        offsets: np.ndarray = self.landmarks - (self.x, self.y)
+        offsets += (self.rng.random(offsets.shape) * 2.0 - 1.0) * self.measurement_noise
+        if self.measurement_range == -1:
+            visible: np.ndarray = np.arange(len(offsets))
+        else:
+            visible = np.flatnonzero((np.abs(offsets) <= abs(self.measurement_range)).all(axis=1))
+        dx, dy = offsets[visible].T.tolist()
+        return list(zip(visible.tolist(), dx, dy))
 
 
     def make_landmarks(self, num_landmarks: int) -> None:
         """Makes random landmarks located in the world"""
-        self.landmarks = []
-        for i in range(num_landmarks):
-            self.landmarks.append([round(random.random() * self.world_size),
-                                   round(random.random() * self.world_size)])
+        self.landmarks = np.round(self.rng.random((num_landmarks, 2)) * self.world_size)
         self.num_landmarks = num_landmarks
 
 
@@ -0,0 +1,301 @@
+import inspect
+from typing import Any, List, Tuple
+import numpy as np
+from scipy import sparse
+from scipy.sparse import linalg as splinalg
+
+# CHOLMOD is optional, without it the direct solver factorizes with SuperLU
+try:
+    from sksparse.cholmod import cholesky as cholmod_cholesky
+except ImportError:
+    cholmod_cholesky = None
+
+
+def collect_constraints(data: Any, N: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Flattens the data of make_data into arrays.
+
+    Args:
+        data: List of [measurements, [dx, dy]] per time step, where every
+        measurement is [landmark_index, dx, dy]
+        N: Number of time steps
+
+    Returns:
+        Tuple of the (M, 2) pose and landmark indices of all measurements,
+        the (M, 2) measured distances and the (T, 2) motions of all time steps
+    """
+    indices: List[Tuple[int, int]] = []
+    distances: List[Tuple[float, float]] = []
+    motions: List[Tuple[float, float]] = []
+    for ts, (measurements, motion) in enumerate(data):
+        for lid, dx, dy in measurements:
+            indices.append((ts, lid))
+            distances.append((dx, dy))
+        motions.append((motion[0], motion[1]))
+    return (np.array(indices, dtype=np.int64).reshape(-1, 2), np.array(distances, dtype=np.float64).reshape(-1, 2),
+            np.array(motions, dtype=np.float64).reshape(-1, 2))
+
+
+def build_constraints(data: Any, N: int, num_landmarks: int, world_size: float, motion_noise: float,
+                      measurement_noise: float) -> Tuple[sparse.csr_matrix, np.ndarray]:
+    """Assembles the information matrix omega and the vector xi in sparse
+    form. Every constraint adds four entries to omega, which are collected
+    as COO triplets and summed up by the conversion to CSR. The x and y
+    coordinates share omega, so xi holds them as two columns.
+
+    Args:
+        data: List of [measurements, [dx, dy]] per time step
+        N: Number of time steps
+        num_landmarks: Number of landmarks
+        world_size: Size of the world, the robot starts in its middle
+        motion_noise: Uncertainty associated with the robot motion
+        measurement_noise: Uncertainty associated with the sensor measurement
+
+    Returns:
+        Tuple of the (N+L, N+L) CSR matrix omega and the (N+L, 2) array xi
+    """
+    indices, distances, motions = collect_constraints(data, N)
+    size: int = N + num_landmarks
+
+    # Every constraint between two variables a and b with strength w
+    # adds w to (a, a) and (b, b) and subtracts it from (a, b) and (b, a)
+    poses: np.ndarray = np.concatenate([indices[:, 0], np.arange(len(motions))])
+    others: np.ndarray = np.concatenate([N + indices[:, 1], np.arange(1, len(motions) + 1)])
+    strengths: np.ndarray = np.concatenate([np.full(len(indices), 1.0 / measurement_noise),
+                                            np.full(len(motions), 1.0 / motion_noise)])
+    rows: np.ndarray = np.concatenate([[0], poses, others, poses, others])
+    cols: np.ndarray = np.concatenate([[0], poses, others, others, poses])
+    values: np.ndarray = np.concatenate([[1.0], strengths, strengths, -strengths, -strengths])
+    omega: sparse.csr_matrix = sparse.coo_matrix((values, (rows, cols)), shape=(size, size)).tocsr()
+
+    # The measured distance pulls the pose back and the landmark forward
+    offsets: np.ndarray = np.concatenate([distances, motions]) * strengths[:, None]
+    xi: np.ndarray = np.zeros((size, 2))
+    xi[0] = world_size / 2.0
+    np.subtract.at(xi, poses, offsets)
+    np.add.at(xi, others, offsets)
+    return omega, xi
+
+
+def _cg(omega: sparse.csr_matrix, b: np.ndarray, tol: float) -> np.ndarray:
+    # Conjugate gradient with a Jacobi preconditioner. The keyword of the
+    # relative tolerance changed from tol to rtol in SciPy 1.12.
+    preconditioner: sparse.dia_matrix = sparse.diags(1.0 / omega.diagonal())
+    keyword: str = 'rtol' if 'rtol' in inspect.signature(splinalg.cg).parameters else 'tol'
+    x, info = splinalg.cg(omega, b, M=preconditioner, maxiter=10 * omega.shape[0], **{keyword: tol})
+    if info != 0:
+        raise RuntimeError(f'Conjugate gradient did not converge, info = {info}')
+    return x
+
+
+def solve(omega: sparse.csr_matrix, xi: np.ndarray, method: str = 'cholesky', tol: float = 1e-10) -> np.ndarray:
+    """Solves omega mu = xi for every column of xi.
+
+    Args:
+        omega: Sparse symmetric positive definite information matrix
+        xi: Right hand sides as columns
+        method: 'cholesky' to factorize omega once, with CHOLMOD if
+        scikit-sparse is installed or with SuperLU otherwise, or 'cg'
+        for preconditioned conjugate gradient
+        tol: Relative tolerance of the conjugate gradient
+
+    Returns:
+        Array of the solutions of the shape of xi
+    """
+    if method == 'cholesky':
+        if cholmod_cholesky is not None:
+            return cholmod_cholesky(omega.tocsc())(xi)
+        # Without pivoting, an ordering for symmetric matrices keeps the 
+        # fill-in of the landmark columns, which link many poses, small
+        return splinalg.splu(omega.tocsc(), permc_spec='MMD_AT_PLUS_A', diag_pivot_thresh=0.0,
+                             options=dict(SymmetricMode=True)).solve(xi)
+    elif method == 'cg':
+        return np.stack([_cg(omega, xi[:, i], tol) for i in range(xi.shape[1])], axis=1)
+    raise ValueError(f'Unknown method {method}, expected cholesky or cg')
+
+
+def interleave(mu: np.ndarray) -> np.ndarray:
+    """Turns (N+L, 2) coordinates into the (2(N+L), 1) vector of
+    interlaced x, y values of the notebook"""
+    return mu.reshape(-1, 1)
+
+
+def slam(data: Any, N: int, num_landmarks: int, world_size: float, motion_noise: float, measurement_noise: float,
+         method: str = 'cholesky') -> np.ndarray:
+    """Implements Graph SLAM for the 2D robot world with a sparse information
+    matrix. The memory grows linearly with the number of constraints instead
+    of quadratically with the number of poses.
+
+    Args:
+        data: Randomly generated data for robot motions and landmarks
+        N: Number of time steps
+        num_landmarks: Number of landmarks
+        world_size: Size of the world
+        motion_noise: Uncertainty associated with the robot motion
+        measurement_noise: Uncertainty associated with the sensor measurement
+        method: Sparse solver, see solve
+
+    Returns:
+        Estimates of all poses and landmarks as interlaced x, y values,
+        of shape (2(N+L), 1) like the dense slam of the notebook
+    """
+    omega, xi = build_constraints(data, N, num_landmarks, world_size, motion_noise, measurement_noise)
+    return interleave(solve(omega, xi, method))
+
+
+def slam_dense(data: Any, N: int, num_landmarks: int, world_size: float, motion_noise: float,
+               measurement_noise: float) -> np.ndarray:
+    """The dense slam of the notebook, with one omega for the x and y
+    coordinates, for comparison.
+
+    Returns:
+        Estimates of all poses and landmarks as interlaced x, y values
+    """
+    size: int = N + num_landmarks
+    omega: np.ndarray = np.zeros((size, size))
+    xi: np.ndarray = np.zeros((size, 2))
+    omega[0, 0] += 1.0
+    xi[0] = world_size / 2.0
+    for ts, (measurements, motion) in enumerate(data):
+        for lid, dx, dy in measurements:
+            lmi: int = N + lid
+            omega[[ts, lmi], [ts, lmi]] += 1.0 / measurement_noise
+            omega[[ts, lmi], [lmi, ts]] -= 1.0 / measurement_noise
+            xi[ts] -= np.array([dx, dy]) / measurement_noise
+            xi[lmi] += np.array([dx, dy]) / measurement_noise
+        omega[[ts, ts + 1], [ts, ts + 1]] += 1.0 / motion_noise
+        omega[[ts, ts + 1], [ts + 1, ts]] -= 1.0 / motion_noise
+        xi[ts] -= np.array(motion) / motion_noise
+        xi[ts + 1] += np.array(motion) / motion_noise
+    return interleave(np.linalg.inv(omega) @ xi)
+
+
+def get_poses_landmarks(mu: np.ndarray, N: int, num_landmarks: int) -> Tuple[List[Tuple[float, float]], List[Tuple[float, float]]]:
+    """Splits the interlaced estimates into a list of poses and a list
+    of landmarks"""
+    coordinates: List[Tuple[float, float]] = [tuple(xy) for xy in np.asarray(mu).reshape(-1, 2).tolist()]
+    return coordinates[:N], coordinates[N:N + num_landmarks]
+
+
+class OnlineSLAM(object):
+    """Graph SLAM for a robot running continuously. Every motion and
+    measurement is added to the information matrix as it arrives, and
+    once the window of poses is full the oldest pose is marginalized
+    out with the Schur complement. The problem is linear, so the
+    estimates of the poses in the window and of the landmarks are the
+    same as those of slam over all poses.
+
+    The information matrix holds the landmarks first and then the poses
+    of the window in a ring of slots, the slot of a marginalized pose is
+    reused by the next one. A pose is only linked to its neighbours in
+    time and to the landmarks it measured, so marginalizing it only
+    updates the block of those variables, and the cost of a step doesn't
+    grow with the time the robot has been running.
+
+    Attributes:
+        num_landmarks: Number of landmarks
+        window: Number of poses kept
+        motion_noise: Uncertainty associated with the robot motion
+        measurement_noise: Uncertainty associated with the sensor measurement
+        omega: Information matrix of the landmarks and the window poses
+        xi: Information vector, the x and y coordinates as two columns
+        seen: Which landmarks were measured at least once
+        first_pose: Time step of the oldest pose in the window
+        last_pose: Time step of the current pose
+    """
+
+    num_landmarks: int
+    window: int
+    motion_noise: float
+    measurement_noise: float
+    omega: np.ndarray
+    xi: np.ndarray
+    seen: np.ndarray
+    first_pose: int
+    last_pose: int
+
+    def __init__(self, num_landmarks: int, world_size: float, motion_noise: float, measurement_noise: float,
+                 window: int = 10) -> None:
+        """Initializes OnlineSLAM with the robot in the middle of the world
+
+        Args:
+            num_landmarks: Number of landmarks
+            world_size: Size of the world
+            motion_noise: Uncertainty associated with the robot motion
+            measurement_noise: Uncertainty associated with the sensor measurement
+            window: Number of poses to keep, at least 2
+        """
+        if window < 2:
+            raise ValueError(f'The window has to hold at least 2 poses, got {window}')
+        self.num_landmarks = num_landmarks
+        self.window = window
+        self.motion_noise = motion_noise
+        self.measurement_noise = measurement_noise
+        size: int = num_landmarks + window
+        self.omega = np.zeros((size, size))
+        self.xi = np.zeros((size, 2))
+        self.seen = np.zeros(num_landmarks, dtype=bool)
+        self.first_pose = 0
+        self.last_pose = 0
+        self.omega[self.slot(0), self.slot(0)] = 1.0
+        self.xi[self.slot(0)] = world_size / 2.0
+
+    def slot(self, pose: int) -> int:
+        """Index of a pose of the window in omega and xi"""
+        return self.num_landmarks + pose % self.window
+
+    def _link(self, a: int, b: int, strength: float, offset: Tuple[float, float]) -> None:
+        # Constraint of b being at offset from a
+        self.omega[[a, b], [a, b]] += strength
+        self.omega[[a, b], [b, a]] -= strength
+        self.xi[a] -= np.multiply(offset, strength)
+        self.xi[b] += np.multiply(offset, strength)
+
+    def add_measurements(self, measurements: List[Tuple[int, float, float]]) -> None:
+        """Adds the measurements [landmark_index, dx, dy] of the current pose"""
+        pose: int = self.slot(self.last_pose)
+        for lid, dx, dy in measurements:
+            self._link(pose, lid, 1.0 / self.measurement_noise, (dx, dy))
+            self.seen[lid] = True
+
+    def add_motion(self, dx: float, dy: float) -> None:
+        """Adds the next pose after a motion by (dx, dy), marginalizing
+        the oldest pose first if the window is full"""
+        if self.last_pose - self.first_pose + 1 == self.window:
+            self.marginalize()
+        self.last_pose += 1
+        self._link(self.slot(self.last_pose - 1), self.slot(self.last_pose), 1.0 / self.motion_noise, (dx, dy))
+
+    def step(self, measurements: List[Tuple[int, float, float]], motion: Tuple[float, float]) -> None:
+        """Adds one time step of the data of make_data"""
+        self.add_measurements(measurements)
+        self.add_motion(motion[0], motion[1])
+
+    def marginalize(self) -> None:
+        """Marginalizes the oldest pose out of the window with the Schur
+        complement and frees its slot"""
+        a: int = self.slot(self.first_pose)
+        linked: np.ndarray = np.flatnonzero(self.omega[a])
+        linked = linked[linked != a]
+        row: np.ndarray = self.omega[a, linked]
+        self.omega[np.ix_(linked, linked)] -= np.outer(row, row) / self.omega[a, a]
+        self.xi[linked] -= np.outer(row, self.xi[a]) / self.omega[a, a]
+        self.omega[a, :] = 0.0
+        self.omega[:, a] = 0.0
+        self.xi[a] = 0.0
+        self.first_pose += 1
+
+    def estimate(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Solves for the poses of the window and the landmarks seen so far.
+
+        Returns:
+            Tuple of the (window poses, 2) array of the poses, oldest first,
+            and the (L, 2) array of the landmarks, NaN for landmarks which
+            were never measured
+        """
+        poses: np.ndarray = np.array([self.slot(pose) for pose in range(self.first_pose, self.last_pose + 1)])
+        landmarks: np.ndarray = np.flatnonzero(self.seen)
+        active: np.ndarray = np.concatenate([landmarks, poses])
+        mu: np.ndarray = np.linalg.solve(self.omega[np.ix_(active, active)], self.xi[active])
+        estimates: np.ndarray = np.full((self.num_landmarks, 2), np.nan)
+        estimates[landmarks] = mu[:len(landmarks)]
+        return mu[len(landmarks):], estimates